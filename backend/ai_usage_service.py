@@ -5,13 +5,113 @@ Handles logging and querying AI usage data.
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from models import AIUsageLog as AIUsageLogModel
+from sqlalchemy import func, and_, insert
+from sqlalchemy.exc import DataError, IntegrityError
+from database import SessionLocal
+from models import AIUsageLog as AIUsageLogModel, AIUsageDaily, generate_uuid
 from schemas import AIUsageLogCreate, AIUsageStats
-from pricing_config import calculate_cost
+from pricing_config import calculate_cost_micros, usd_to_micros, micros_to_usd
 from typing import Optional, List, Dict, Any
-from datetime import datetime, timedelta
-import uuid
+from datetime import datetime, timedelta, timezone
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Usage rows are buffered and written in batches by a background thread
+USAGE_QUEUE_MAX_SIZE = 10_000
+USAGE_FLUSH_MAX_ROWS = 500  # Rows per bulk insert
+USAGE_FLUSH_INTERVAL = 0.2  # Seconds to wait for more rows before flushing
+
+_usage_queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=USAGE_QUEUE_MAX_SIZE)
+_flusher_thread: Optional[threading.Thread] = None
+_flusher_lock = threading.Lock()
+
+
+def _drain_batch(block: bool = True) -> List[Dict[str, Any]]:
+    """Collect up to USAGE_FLUSH_MAX_ROWS rows, waiting at most USAGE_FLUSH_INTERVAL."""
+    batch = []
+    try:
+        batch.append(_usage_queue.get(timeout=USAGE_FLUSH_INTERVAL) if block else _usage_queue.get_nowait())
+    except queue.Empty:
+        return batch
+
+    deadline = time.monotonic() + USAGE_FLUSH_INTERVAL
+    while len(batch) < USAGE_FLUSH_MAX_ROWS:
+        remaining = deadline - time.monotonic()
+        try:
+            batch.append(_usage_queue.get(timeout=remaining) if block and remaining > 0 else _usage_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _insert_rows(db: Session, rows: List[Dict[str, Any]]):
+    """
+    Insert rows in one transaction. If that fails, bisect so the good rows are
+    still written and only the rows that fail on their own are dropped (e.g. a
+    project deleted between the request and the flush).
+    """
+    try:
+        db.execute(insert(AIUsageLogModel), rows)
+        db.commit()
+        return
+    except (IntegrityError, DataError) as e:
+        # Caused by the data of some row; find it
+        db.rollback()
+        if len(rows) == 1:
+            row = rows[0]
+            logger.error(
+                "Dropped AI usage record %s (user=%s workspace=%s project=%s model=%s): %s",
+                row["id"], row["user_id"], row["workspace_id"], row["project_id"], row["model"], e
+            )
+            return
+    except Exception as e:
+        # Not row-specific (connection lost, database down): retrying each row won't help
+        db.rollback()
+        logger.error("Dropped %d AI usage records: %s", len(rows), e)
+        return
+
+    middle = len(rows) // 2
+    _insert_rows(db, rows[:middle])
+    _insert_rows(db, rows[middle:])
+
+
+def _write_batch(batch: List[Dict[str, Any]]):
+    """Insert a batch of usage rows, in a single transaction when all of them are valid."""
+    db = SessionLocal()
+    try:
+        _insert_rows(db, batch)
+    finally:
+        db.close()
+
+
+def _flusher_loop():
+    while True:
+        batch = _drain_batch()
+        if batch:
+            _write_batch(batch)
+
+
+def _ensure_flusher():
+    global _flusher_thread
+    if _flusher_thread is not None:
+        return
+    with _flusher_lock:
+        if _flusher_thread is None:
+            _flusher_thread = threading.Thread(target=_flusher_loop, name="ai-usage-flusher", daemon=True)
+            _flusher_thread.start()
+
+
+def flush_usage_logs():
+    """Write out everything still buffered. Called on shutdown."""
+    while True:
+        batch = _drain_batch(block=False)
+        if not batch:
+            return
+        _write_batch(batch)
 
 
 def log_ai_usage(
@@ -29,10 +129,13 @@ def log_ai_usage(
     tool_calls: Optional[List[str]] = None,
     duration_ms: Optional[int] = None,
     cost: Optional[float] = None
-) -> AIUsageLogModel:
+) -> None:
     """
     Log an AI usage record.
 
+    The row is queued and written by a background thread in batches, so the
+    request path doesn't pay for an INSERT and commit per model call.
+
     Args:
         db: Database session
         user_id: ID of the user making the request
@@ -48,23 +151,17 @@ def log_ai_usage(
         tool_calls: Optional list of tool names used
         duration_ms: Optional response time in milliseconds
         cost: Optional explicit cost (overrides calculation)
-
-    Returns:
-        Created AIUsageLog instance
     """
-    # Calculate costs
+    # Calculate costs (totals are generated columns computed by Postgres)
     if cost is not None:
-        total_cost = cost
-        input_cost = 0.0
-        output_cost = cost
+        input_cost_micros = 0
+        output_cost_micros = usd_to_micros(cost)
     else:
-        input_cost, output_cost, total_cost = calculate_cost(model, input_tokens, output_tokens)
-    
-    total_tokens = input_tokens + output_tokens
+        input_cost_micros, output_cost_micros, _ = calculate_cost_micros(model, input_tokens, output_tokens)
 
     # Create log entry
-    usage_log = AIUsageLogModel(
-        id=str(uuid.uuid4()),
+    row = dict(
+        id=generate_uuid(),
         user_id=user_id,
         workspace_id=workspace_id,
         project_id=project_id,
@@ -73,21 +170,22 @@ def log_ai_usage(
         request_type=request_type,
         input_tokens=input_tokens,
         output_tokens=output_tokens,
-        total_tokens=total_tokens,
-        input_cost=input_cost,
-        output_cost=output_cost,
-        total_cost=total_cost,
+        input_cost_micros=input_cost_micros,
+        output_cost_micros=output_cost_micros,
         prompt_preview=prompt_preview[:500] if prompt_preview else None,
         response_preview=response_preview[:500] if response_preview else None,
         tool_calls=tool_calls,
-        duration_ms=duration_ms
+        duration_ms=duration_ms,
+        created_at=datetime.now(timezone.utc)
     )
 
-    db.add(usage_log)
-    db.commit()
-    db.refresh(usage_log)
-
-    return usage_log
+    try:
+        _usage_queue.put_nowait(row)
+        _ensure_flusher()
+    except queue.Full:
+        # Writer is falling behind - record this one on the caller's session
+        db.add(AIUsageLogModel(**row))
+        db.commit()
 
 
 def get_usage_stats(
@@ -131,7 +229,7 @@ def get_usage_stats(
         func.sum(AIUsageLogModel.total_tokens).label('total_tokens'),
         func.sum(AIUsageLogModel.input_tokens).label('total_input_tokens'),
         func.sum(AIUsageLogModel.output_tokens).label('total_output_tokens'),
-        func.sum(AIUsageLogModel.total_cost).label('total_cost')
+        func.sum(AIUsageLogModel.total_cost_micros).label('total_cost')
     )
 
     if filters:
@@ -144,7 +242,7 @@ def get_usage_stats(
         AIUsageLogModel.model,
         func.count(AIUsageLogModel.id).label('requests'),
         func.sum(AIUsageLogModel.total_tokens).label('tokens'),
-        func.sum(AIUsageLogModel.total_cost).label('cost')
+        func.sum(AIUsageLogModel.total_cost_micros).label('cost')
     )
     if filters:
         by_model_query = by_model_query.filter(and_(*filters))
@@ -154,7 +252,7 @@ def get_usage_stats(
         by_model[row.model] = {
             'requests': row.requests,
             'tokens': int(row.tokens or 0),
-            'cost': float(row.cost or 0)
+            'cost': micros_to_usd(row.cost)
         }
 
     # Get breakdown by provider
@@ -162,7 +260,7 @@ def get_usage_stats(
         AIUsageLogModel.provider,
         func.count(AIUsageLogModel.id).label('requests'),
         func.sum(AIUsageLogModel.total_tokens).label('tokens'),
-        func.sum(AIUsageLogModel.total_cost).label('cost')
+        func.sum(AIUsageLogModel.total_cost_micros).label('cost')
     )
     if filters:
         by_provider_query = by_provider_query.filter(and_(*filters))
@@ -172,7 +270,7 @@ def get_usage_stats(
         by_provider[row.provider] = {
             'requests': row.requests,
             'tokens': int(row.tokens or 0),
-            'cost': float(row.cost or 0)
+            'cost': micros_to_usd(row.cost)
         }
 
     # Get breakdown by request type
@@ -180,7 +278,7 @@ def get_usage_stats(
         AIUsageLogModel.request_type,
         func.count(AIUsageLogModel.id).label('requests'),
         func.sum(AIUsageLogModel.total_tokens).label('tokens'),
-        func.sum(AIUsageLogModel.total_cost).label('cost')
+        func.sum(AIUsageLogModel.total_cost_micros).label('cost')
     )
     if filters:
         by_type_query = by_type_query.filter(and_(*filters))
@@ -190,7 +288,7 @@ def get_usage_stats(
         by_request_type[row.request_type] = {
             'requests': row.requests,
             'tokens': int(row.tokens or 0),
-            'cost': float(row.cost or 0)
+            'cost': micros_to_usd(row.cost)
         }
 
     return AIUsageStats(
@@ -198,7 +296,7 @@ def get_usage_stats(
         total_tokens=int(result.total_tokens or 0),
         total_input_tokens=int(result.total_input_tokens or 0),
         total_output_tokens=int(result.total_output_tokens or 0),
-        total_cost=float(result.total_cost or 0),
+        total_cost=micros_to_usd(result.total_cost),
         by_model=by_model,
         by_provider=by_provider,
         by_request_type=by_request_type,
@@ -207,6 +305,117 @@ def get_usage_stats(
     )
 
 
+def get_usage_summary(
+    db: Session,
+    periods: Dict[str, Optional[datetime]],
+    user_id: Optional[str] = None,
+    workspace_id: Optional[str] = None,
+    project_id: Optional[str] = None,
+    end_date: Optional[datetime] = None
+) -> Dict[str, AIUsageStats]:
+    """
+    Get aggregated usage statistics for several periods in one query.
+
+    Each period gets its own FILTERed aggregates over a single scan, grouped by
+    model/provider/request type; totals and breakdowns are folded in Python.
+
+    Args:
+        db: Database session
+        periods: Period name -> start date (None for all time)
+        user_id: Filter by user ID
+        workspace_id: Filter by workspace ID
+        project_id: Filter by project ID
+        end_date: Upper bound applied to the dated periods
+
+    Returns:
+        Period name -> AIUsageStats
+    """
+    filters = []
+    if user_id:
+        filters.append(AIUsageLogModel.user_id == user_id)
+    if workspace_id:
+        filters.append(AIUsageLogModel.workspace_id == workspace_id)
+    if project_id:
+        filters.append(AIUsageLogModel.project_id == project_id)
+
+    columns = []
+    for name, start_date in periods.items():
+        condition = []
+        if start_date:
+            condition.append(AIUsageLogModel.created_at >= start_date)
+            if end_date:
+                condition.append(AIUsageLogModel.created_at <= end_date)
+
+        def aggregate(expr, label):
+            agg = expr.filter(and_(*condition)) if condition else expr
+            return agg.label(f"{name}_{label}")
+
+        columns += [
+            aggregate(func.count(AIUsageLogModel.id), "requests"),
+            aggregate(func.sum(AIUsageLogModel.total_tokens), "tokens"),
+            aggregate(func.sum(AIUsageLogModel.input_tokens), "input_tokens"),
+            aggregate(func.sum(AIUsageLogModel.output_tokens), "output_tokens"),
+            aggregate(func.sum(AIUsageLogModel.total_cost_micros), "cost"),
+        ]
+
+    query = db.query(
+        AIUsageLogModel.model,
+        AIUsageLogModel.provider,
+        AIUsageLogModel.request_type,
+        *columns
+    )
+    if filters:
+        query = query.filter(and_(*filters))
+    rows = query.group_by(
+        AIUsageLogModel.model,
+        AIUsageLogModel.provider,
+        AIUsageLogModel.request_type
+    ).all()
+
+    summary = {}
+    for name, start_date in periods.items():
+        totals = {'requests': 0, 'tokens': 0, 'input_tokens': 0, 'output_tokens': 0, 'cost': 0}
+        breakdowns = {'model': {}, 'provider': {}, 'request_type': {}}
+
+        for row in rows:
+            requests = getattr(row, f"{name}_requests")
+            if not requests:
+                continue
+            tokens = int(getattr(row, f"{name}_tokens") or 0)
+            cost = int(getattr(row, f"{name}_cost") or 0)
+
+            totals['requests'] += requests
+            totals['tokens'] += tokens
+            totals['input_tokens'] += int(getattr(row, f"{name}_input_tokens") or 0)
+            totals['output_tokens'] += int(getattr(row, f"{name}_output_tokens") or 0)
+            totals['cost'] += cost
+
+            for key, breakdown in breakdowns.items():
+                entry = breakdown.setdefault(getattr(row, key), {'requests': 0, 'tokens': 0, 'cost': 0})
+                entry['requests'] += requests
+                entry['tokens'] += tokens
+                entry['cost'] += cost
+
+        for breakdown in breakdowns.values():
+            for entry in breakdown.values():
+                entry['cost'] = micros_to_usd(entry['cost'])
+
+        summary[name] = AIUsageStats(
+            total_requests=totals['requests'],
+            total_tokens=totals['tokens'],
+            total_input_tokens=totals['input_tokens'],
+            total_output_tokens=totals['output_tokens'],
+            total_cost=micros_to_usd(totals['cost']),
+            by_model=breakdowns['model'],
+            by_provider=breakdowns['provider'],
+            by_request_type=breakdowns['request_type'],
+            start_date=start_date,
+            end_date=end_date if start_date else None
+        )
+
+    return summary
+
+
 def get_usage_logs(
     db: Session,
     user_id: Optional[str] = None,
@@ -276,32 +485,33 @@ def get_daily_usage_trend(
     Returns:
         List of dictionaries with date, requests, tokens, cost
     """
-    start_date = datetime.utcnow() - timedelta(days=days)
+    start_date = (datetime.utcnow() - timedelta(days=days)).date()
 
+    # Read the trigger-maintained daily rollup instead of grouping raw log rows
     query = db.query(
-        func.date(AIUsageLogModel.created_at).label('date'),
-        func.count(AIUsageLogModel.id).label('requests'),
-        func.sum(AIUsageLogModel.total_tokens).label('tokens'),
-        func.sum(AIUsageLogModel.total_cost).label('cost')
-    ).filter(AIUsageLogModel.created_at >= start_date)
+        AIUsageDaily.day.label('date'),
+        func.sum(AIUsageDaily.requests).label('requests'),
+        func.sum(AIUsageDaily.total_tokens).label('tokens'),
+        func.sum(AIUsageDaily.total_cost_micros).label('cost')
+    ).filter(AIUsageDaily.day >= start_date)
 
     if user_id:
-        query = query.filter(AIUsageLogModel.user_id == user_id)
+        query = query.filter(AIUsageDaily.user_id == user_id)
     if workspace_id:
-        query = query.filter(AIUsageLogModel.workspace_id == workspace_id)
+        query = query.filter(AIUsageDaily.workspace_id == workspace_id)
     if project_id:
-        query = query.filter(AIUsageLogModel.project_id == project_id)
+        query = query.filter(AIUsageDaily.project_id == project_id)
 
-    query = query.group_by(func.date(AIUsageLogModel.created_at))
-    query = query.order_by(func.date(AIUsageLogModel.created_at))
+    query = query.group_by(AIUsageDaily.day)
+    query = query.order_by(AIUsageDaily.day)
 
     results = []
     for row in query.all():
         results.append({
             'date': str(row.date),
-            'requests': row.requests,
+            'requests': int(row.requests or 0),
             'tokens': int(row.tokens or 0),
-            'cost': float(row.cost or 0)
+            'cost': micros_to_usd(row.cost)
         })
 
     return results
@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Final, Optional
 import os
-from jose import JWTError, jwt
+from jose import JWTError, jwk, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
@@ -14,6 +14,14 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "10080"))  # 7 days default
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))  # 30 days default
 
+# Token lifetimes, built once instead of per issued token
+ACCESS_TOKEN_TTL: Final = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+REFRESH_TOKEN_TTL: Final = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+PASSWORD_RESET_TOKEN_TTL: Final = timedelta(hours=1)
+
+# HMAC key object built once; jose otherwise constructs it from the secret on every encode/decode
+_JWT_KEY = jwk.construct(SECRET_KEY, ALGORITHM)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -22,37 +30,53 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = datetime.utcnow() + ACCESS_TOKEN_TTL
     to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _JWT_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def create_refresh_token(data: dict):
     """Create JWT refresh token (longer expiration)"""
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    expire = datetime.utcnow() + REFRESH_TOKEN_TTL
     to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _JWT_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def create_password_reset_token(email: str) -> str:
     """Create password reset token (expires in 1 hour)"""
-    expire = datetime.utcnow() + timedelta(hours=1)
+    expire = datetime.utcnow() + PASSWORD_RESET_TOKEN_TTL
     to_encode = {"sub": email, "exp": expire, "type": "password_reset"}
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(to_encode, _JWT_KEY, algorithm=ALGORITHM)
 
 def verify_token(token: str) -> Optional[dict]:
     """Verify any JWT token and return payload"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, _JWT_KEY, algorithms=[ALGORITHM])
         return payload
     except JWTError:
         return None
 
+def decode_refresh_token(token: str) -> Optional[dict]:
+    """
+    Decode a refresh token, with exp and sub required by the decoder itself.
+    Returns None if the token is invalid, expired, or not a refresh token.
+    """
+    try:
+        payload = jwt.decode(
+            token, _JWT_KEY, algorithms=[ALGORITHM],
+            options={"require_exp": True, "require_sub": True}
+        )
+    except JWTError:
+        return None
+    if payload.get("type") != "refresh" or not payload["sub"]:
+        return None
+    return payload
+
 def verify_password_reset_token(token: str) -> Optional[str]:
     """Verify password reset token and return email"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, _JWT_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         token_type: str = payload.get("type")
 
@@ -71,7 +95,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, _JWT_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         token_type: str = payload.get("type", "access")
         
@@ -1,11 +1,42 @@
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from models import User, Workspace, Project, WorkspaceUser, Document, Folder, ActivityLog
 from schemas import UserCreate, WorkspaceCreate, ProjectCreate, DocumentCreate, DocumentUpdate, UserUpdate, WorkspaceUpdate
+from schemas import User as UserSchema
 from passlib.context import CryptContext
 from datetime import datetime
-from typing import Optional, List
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from typing import Optional, List, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+import os
+import threading
+import time
+import uuid
+
+# Argon2id (argon2-cffi C backend), sized for an interactive login: OWASP's
+# m=46 MiB, t=1-2, p=1. Overridable so it can be retuned per hardware.
+# bcrypt hashes from before the switch still verify and are upgraded on login.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", str(46 * 1024)))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+    argon2__digest_size=32,
+)
+
+def is_valid_uuid(value) -> bool:
+    """Ids are native UUID columns; anything else would fail in Postgres instead of not matching."""
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
 
 def get_password_hash(password):
     return pwd_context.hash(password)
@@ -13,18 +44,80 @@ def get_password_hash(password):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+# Verified against when the account doesn't exist, so a login takes the same
+# time whether or not the email is registered
+_DUMMY_PASSWORD_HASH = pwd_context.hash(os.urandom(16).hex())
+
+def authenticate_user(db: Session, user: Optional[User], plain_password: str) -> bool:
+    """Verify a login password, re-hashing it with the current parameters if they changed."""
+    if user is None:
+        pwd_context.verify(plain_password, _DUMMY_PASSWORD_HASH)
+        return False
+    valid, new_hash = pwd_context.verify_and_update(plain_password, user.hashed_password)
+    if valid and new_hash:
+        user.hashed_password = new_hash
+        db.commit()
+    return valid
+
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
-def create_user(db: Session, user: UserCreate):
+# Short-lived LRU of user lookups for paths that only need to know the user
+# exists (token refresh). Entries are plain dataclasses, not session-bound rows.
+USER_CACHE_TTL = 60  # Seconds
+USER_CACHE_MAX_ENTRIES = 10_000
+
+@dataclass(frozen=True)
+class CachedUser:
+    id: str
+    email: str
+    hashed_password: str
+    full_name: Optional[str]
+
+_user_cache: "OrderedDict[str, Tuple[Optional[CachedUser], float]]" = OrderedDict()  # email -> (user, expires_at)
+_user_cache_lock = threading.Lock()
+
+def invalidate_cached_user(email: str):
+    with _user_cache_lock:
+        _user_cache.pop(email, None)
+
+def cached_get_user_by_email(db: Session, email: str) -> Optional[CachedUser]:
+    """get_user_by_email through a USER_CACHE_TTL cache (misses are cached too)."""
+    now = time.monotonic()
+    with _user_cache_lock:
+        entry = _user_cache.get(email)
+        if entry is not None and entry[1] > now:
+            _user_cache.move_to_end(email)
+            return entry[0]
+
+    db_user = get_user_by_email(db, email)
+    user = CachedUser(
+        id=db_user.id,
+        email=db_user.email,
+        hashed_password=db_user.hashed_password,
+        full_name=db_user.full_name
+    ) if db_user else None
+
+    with _user_cache_lock:
+        _user_cache[email] = (user, now + USER_CACHE_TTL)
+        _user_cache.move_to_end(email)
+        while len(_user_cache) > USER_CACHE_MAX_ENTRIES:
+            _user_cache.popitem(last=False)
+    return user
+
+def create_user(db: Session, user: UserCreate) -> UserSchema:
     hashed_password = get_password_hash(user.password)
     db_user = User(email=user.email, hashed_password=hashed_password, full_name=user.full_name)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
-    return db_user
+    invalidate_cached_user(db_user.email)
+    # Detached DTO: response serialization doesn't touch the session
+    return UserSchema.model_validate(db_user)
 
-def update_user(db: Session, user_id: str, user_update: UserUpdate):
+def update_user(db: Session, user_id: str, user_update: UserUpdate) -> Optional[UserSchema]:
+    if not is_valid_uuid(user_id):
+        return None
     db_user = db.query(User).filter(User.id == user_id).first()
     if not db_user:
         return None
@@ -34,14 +127,18 @@ def update_user(db: Session, user_id: str, user_update: UserUpdate):
     if user_update.password is not None:
         db_user.hashed_password = get_password_hash(user_update.password)
     if user_update.email is not None:
+        invalidate_cached_user(db_user.email)
         db_user.email = user_update.email
 
     db.commit()
     db.refresh(db_user)
-    return db_user
+    invalidate_cached_user(db_user.email)
+    return UserSchema.model_validate(db_user)
 
 def update_user_password(db: Session, user_id: str, new_password: str):
     """Update user password (for password reset)"""
+    if not is_valid_uuid(user_id):
+        return None
     db_user = db.query(User).filter(User.id == user_id).first()
     if not db_user:
         return None
@@ -49,6 +146,7 @@ def update_user_password(db: Session, user_id: str, new_password: str):
     db_user.hashed_password = get_password_hash(new_password)
     db.commit()
     db.refresh(db_user)
+    invalidate_cached_user(db_user.email)
     return db_user
 
 def create_workspace(db: Session, workspace: WorkspaceCreate, user_id: str):
@@ -68,9 +166,13 @@ def get_user_workspaces(db: Session, user_id: str):
     return db.query(Workspace).join(WorkspaceUser).filter(WorkspaceUser.user_id == user_id).all()
 
 def get_workspace(db: Session, workspace_id: str):
+    if not is_valid_uuid(workspace_id):
+        return None
     return db.query(Workspace).filter(Workspace.id == workspace_id).first()
 
 def update_workspace(db: Session, workspace_id: str, workspace_update: WorkspaceUpdate):
+    if not is_valid_uuid(workspace_id):
+        return None
     db_workspace = db.query(Workspace).filter(Workspace.id == workspace_id).first()
     if not db_workspace:
         return None
@@ -111,22 +213,20 @@ def add_workspace_member(db: Session, workspace_id: str, user_email: str, role:
     if not user:
         return None
 
-    # Check if already a member
-    existing = db.query(WorkspaceUser).filter(
-        WorkspaceUser.workspace_id == workspace_id,
-        WorkspaceUser.user_id == user.id
-    ).first()
-
-    if existing:
+    # The (workspace_id, user_id) primary key rejects duplicates; no row inserted means already a member
+    result = db.execute(
+        pg_insert(WorkspaceUser)
+        .values(workspace_id=workspace_id, user_id=user.id, role=role)
+        .on_conflict_do_nothing(index_elements=["workspace_id", "user_id"])
+    )
+    if result.rowcount == 0:
+        db.rollback()
         return {"error": "User is already a member"}
+    db.commit()
 
     # Get workspace info for email
     workspace = db.query(Workspace).filter(Workspace.id == workspace_id).first()
 
-    workspace_user = WorkspaceUser(workspace_id=workspace_id, user_id=user.id, role=role)
-    db.add(workspace_user)
-    db.commit()
-
     # Send welcome email
     from email_service import send_welcome_email
     if workspace:
@@ -173,6 +273,8 @@ def get_project_documents(db: Session, project_id: str):
     ).all()
 
 def get_document(db: Session, document_id: str):
+    if not is_valid_uuid(document_id):
+        return None
     return db.query(Document).filter(Document.id == document_id).first()
 
 def create_document(db: Session, document: DocumentCreate, project_id: str):
@@ -190,6 +292,8 @@ def create_document(db: Session, document: DocumentCreate, project_id: str):
 def update_document(db: Session, document_id: str, document: DocumentUpdate):
     from datetime import datetime
 
+    if not is_valid_uuid(document_id):
+        return None
     db_document = db.query(Document).filter(Document.id == document_id).first()
     if not db_document:
         return None
@@ -210,6 +314,8 @@ def update_document(db: Session, document_id: str, document: DocumentUpdate):
 
 def delete_document(db: Session, document_id: str):
     """Hard delete - use soft_delete_document for archiving"""
+    if not is_valid_uuid(document_id):
+        return False
     db_document = db.query(Document).filter(Document.id == document_id).first()
     if db_document:
         db.delete(db_document)
@@ -219,6 +325,8 @@ def delete_document(db: Session, document_id: str):
 
 def soft_delete_document(db: Session, document_id: str, user_id: Optional[str] = None):
     """Soft delete (archive) a document"""
+    if not is_valid_uuid(document_id):
+        return None
     db_document = db.query(Document).filter(Document.id == document_id).first()
     if not db_document:
         return None
@@ -250,6 +358,8 @@ def soft_delete_document(db: Session, document_id: str, user_id: Optional[str] =
 # ========== FOLDER CRUD FUNCTIONS ==========
 
 def get_folder(db: Session, folder_id: str):
+    if not is_valid_uuid(folder_id):
+        return None
     return db.query(Folder).filter(
         Folder.id == folder_id,
         Folder.deleted_at == None
@@ -397,22 +507,23 @@ def soft_delete_folder(db: Session, folder_id: str, cascade: bool = True, user_i
 
     if cascade:
         # Soft delete all documents in this folder
-        documents = db.query(Document).filter(
+        # Only ids are needed here; avoid detoasting document content for the scan
+        document_ids = db.query(Document.id).filter(
             Document.folder_id == folder_id,
             Document.deleted_at == None
         ).all()
 
-        for doc in documents:
-            soft_delete_document(db, doc.id, user_id)
+        for (document_id,) in document_ids:
+            soft_delete_document(db, document_id, user_id)
 
         # Recursively soft delete subfolders
-        subfolders = db.query(Folder).filter(
+        subfolder_ids = db.query(Folder.id).filter(
             Folder.parent_folder_id == folder_id,
             Folder.deleted_at == None
         ).all()
 
-        for subfolder in subfolders:
-            soft_delete_folder(db, subfolder.id, cascade=True, user_id=user_id)
+        for (subfolder_id,) in subfolder_ids:
+            soft_delete_folder(db, subfolder_id, cascade=True, user_id=user_id)
 
     db.commit()
     db.refresh(db_folder)
@@ -420,6 +531,8 @@ def soft_delete_folder(db: Session, folder_id: str, cascade: bool = True, user_i
 
 def move_document(db: Session, document_id: str, folder_id: Optional[str], user_id: Optional[str] = None):
     """Move a document to a different folder"""
+    if not is_valid_uuid(document_id):
+        return None
     db_document = db.query(Document).filter(Document.id == document_id).first()
     if not db_document:
         return None
@@ -493,6 +606,8 @@ def list_archived_folders(db: Session, project_id: str):
 
 def restore_document(db: Session, document_id: str, user_id: Optional[str] = None):
     """Restore a soft-deleted document"""
+    if not is_valid_uuid(document_id):
+        return None
     db_document = db.query(Document).filter(Document.id == document_id).first()
     if not db_document or not db_document.deleted_at:
         return None
@@ -518,6 +633,8 @@ def restore_document(db: Session, document_id: str, user_id: Optional[str] = Non
 
 def restore_folder(db: Session, folder_id: str, restore_contents: bool = False, user_id: Optional[str] = None):
     """Restore a soft-deleted folder"""
+    if not is_valid_uuid(folder_id):
+        return None
     db_folder = db.query(Folder).filter(Folder.id == folder_id).first()
     if not db_folder or not db_folder.deleted_at:
         return None
@@ -540,22 +657,22 @@ def restore_folder(db: Session, folder_id: str, restore_contents: bool = False,
 
     if restore_contents:
         # Restore all documents in this folder
-        documents = db.query(Document).filter(
+        document_ids = db.query(Document.id).filter(
             Document.folder_id == folder_id,
             Document.deleted_at != None
         ).all()
 
-        for doc in documents:
-            restore_document(db, doc.id, user_id)
+        for (document_id,) in document_ids:
+            restore_document(db, document_id, user_id)
 
         # Restore subfolders
-        subfolders = db.query(Folder).filter(
+        subfolder_ids = db.query(Folder.id).filter(
             Folder.parent_folder_id == folder_id,
             Folder.deleted_at != None
         ).all()
 
-        for subfolder in subfolders:
-            restore_folder(db, subfolder.id, restore_contents=True, user_id=user_id)
+        for (subfolder_id,) in subfolder_ids:
+            restore_folder(db, subfolder_id, restore_contents=True, user_id=user_id)
 
     db.commit()
     db.refresh(db_folder)
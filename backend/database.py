@@ -1,11 +1,24 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://xtyl:xtylpassword@db:5432/xtyl_db")
 
-engine = create_engine(DATABASE_URL)
+# Sized for the request threadpool (40 threads) plus background workers; a request
+# waits at most DB_POOL_TIMEOUT for a connection instead of stalling indefinitely
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "40"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_WARM = int(os.getenv("DB_POOL_WARM", "5"))  # Connections opened at startup
+
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -16,3 +29,15 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def warm_pool(size: int = DB_POOL_WARM):
+    """Open `size` pooled connections up front so the first requests don't pay for connects."""
+    conns = []
+    try:
+        for _ in range(min(size, DB_POOL_SIZE)):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            conns.append(conn)
+    finally:
+        for conn in conns:
+            conn.close()  # Returns it to the pool, still open
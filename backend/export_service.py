@@ -13,6 +13,21 @@ from weasyprint import HTML, CSS
 from weasyprint.text.fonts import FontConfiguration
 import re
 
+# Markdown patterns used line-by-line by the DOCX exporter, compiled once
+_HEADING_RE = re.compile(r'^(#{1,6})\s+(.+)$')
+_BULLET_START_RE = re.compile(r'^\s*[-*+]\s+')
+_BULLET_RE = re.compile(r'^(\s*)([-*+])\s+(.+)$')
+_NUMBERED_START_RE = re.compile(r'^\s*\d+\.\s+')
+_NUMBERED_RE = re.compile(r'^(\s*)(\d+)\.\s+(.+)$')
+_TABLE_SEPARATOR_RE = re.compile(r'^\|[\s\-:]+\|$')
+_BOLD_SPLIT_RE = re.compile(r'(\*\*.*?\*\*|__.*?__)')
+_STAR_ITALIC_RE = re.compile(r'(?<!\*)\*(?!\*).*?(?<!\*)\*(?!\*)')
+_UNDERSCORE_ITALIC_RE = re.compile(r'(?<!_)_(?!_).*?(?<!_)_(?!_)')
+_ITALIC_SPLIT_RE = re.compile(r'((?<!\*)\*(?!\*).*?(?<!\*)\*(?!\*)|(?<!_)_(?!_).*?(?<!_)_(?!_))')
+_CODE_SPLIT_RE = re.compile(r'(`[^`]+?`)')
+_STAR_ITALIC_PART_RE = re.compile(r'^\*[^*]+\*$')
+_UNDERSCORE_ITALIC_PART_RE = re.compile(r'^_[^_]+_$')
+
 
 def export_to_markdown(content: str, title: str) -> bytes:
     """
@@ -272,7 +287,7 @@ def export_to_docx(content: str, title: str) -> bytes:
 
         # Handle headings
         if line.startswith('#'):
-            heading_match = re.match(r'^(#{1,6})\s+(.+)$', line)
+            heading_match = _HEADING_RE.match(line)
             if heading_match:
                 level = len(heading_match.group(1))
                 heading_text = heading_match.group(2)
@@ -294,8 +309,8 @@ def export_to_docx(content: str, title: str) -> bytes:
             continue
 
         # Handle unordered lists
-        if re.match(r'^\s*[-*+]\s+', line):
-            list_match = re.match(r'^(\s*)([-*+])\s+(.+)$', line)
+        if _BULLET_START_RE.match(line):
+            list_match = _BULLET_RE.match(line)
             if list_match:
                 indent = len(list_match.group(1))
                 text = list_match.group(3)
@@ -304,8 +319,8 @@ def export_to_docx(content: str, title: str) -> bytes:
                 continue
 
         # Handle ordered lists
-        if re.match(r'^\s*\d+\.\s+', line):
-            list_match = re.match(r'^(\s*)(\d+)\.\s+(.+)$', line)
+        if _NUMBERED_START_RE.match(line):
+            list_match = _NUMBERED_RE.match(line)
             if list_match:
                 text = list_match.group(3)
                 p = doc.add_paragraph(text, style='List Number')
@@ -318,7 +333,7 @@ def export_to_docx(content: str, title: str) -> bytes:
             table_rows = []
             while i < len(lines) and '|' in lines[i]:
                 row_line = lines[i].strip()
-                if not re.match(r'^\|[\s\-:]+\|$', row_line):  # Skip separator row
+                if not _TABLE_SEPARATOR_RE.match(row_line):  # Skip separator row
                     cells = [cell.strip() for cell in row_line.split('|')[1:-1]]
                     table_rows.append(cells)
                 i += 1
@@ -353,15 +368,15 @@ def export_to_docx(content: str, title: str) -> bytes:
             # Handle bold (**text** or __text__)
             for part in parts[:]:
                 if '**' in part or '__' in part:
-                    segments = re.split(r'(\*\*.*?\*\*|__.*?__)', part)
+                    segments = _BOLD_SPLIT_RE.split(part)
                     parts.remove(part)
                     parts.extend(segments)
 
             # Handle italic (*text* or _text_)
             new_parts = []
             for part in parts:
-                if re.search(r'(?<!\*)\*(?!\*).*?(?<!\*)\*(?!\*)', part) or re.search(r'(?<!_)_(?!_).*?(?<!_)_(?!_)', part):
-                    segments = re.split(r'((?<!\*)\*(?!\*).*?(?<!\*)\*(?!\*)|(?<!_)_(?!_).*?(?<!_)_(?!_))', part)
+                if _STAR_ITALIC_RE.search(part) or _UNDERSCORE_ITALIC_RE.search(part):
+                    segments = _ITALIC_SPLIT_RE.split(part)
                     new_parts.extend(segments)
                 else:
                     new_parts.append(part)
@@ -371,7 +386,7 @@ def export_to_docx(content: str, title: str) -> bytes:
             new_parts = []
             for part in parts:
                 if '`' in part:
-                    segments = re.split(r'(`[^`]+?`)', part)
+                    segments = _CODE_SPLIT_RE.split(part)
                     new_parts.extend(segments)
                 else:
                     new_parts.append(part)
@@ -391,10 +406,10 @@ def export_to_docx(content: str, title: str) -> bytes:
                 elif part.startswith('__') and part.endswith('__'):
                     run.text = part[2:-2]
                     run.font.bold = True
-                elif re.match(r'^\*[^*]+\*$', part):
+                elif _STAR_ITALIC_PART_RE.match(part):
                     run.text = part[1:-1]
                     run.font.italic = True
-                elif re.match(r'^_[^_]+_$', part):
+                elif _UNDERSCORE_ITALIC_PART_RE.match(part):
                     run.text = part[1:-1]
                     run.font.italic = True
                 elif part.startswith('`') and part.endswith('`'):
@@ -4,19 +4,75 @@ Handles image generation using OpenRouter API with support for multiple models
 """
 
 import os
+import asyncio
 import httpx
 import base64
 import json
+import orjson
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 import uuid
-from minio_service import upload_file
+import redis.asyncio as aioredis
+from minio_service import upload_file_async
 
 DEFAULT_MODEL = "google/gemini-2.5-flash-image-preview"
 
-# Cache for models (updated periodically)
+# Shared client so OpenRouter and MinIO requests reuse keep-alive connections
+_http_client = httpx.AsyncClient(timeout=30.0)
+
+# Cache for models (updated periodically). Redis holds the shared copy so
+# every worker process doesn't hit OpenRouter on its own; the in-process
+# cache is a short-lived L1 in front of it.
+MODELS_CACHE_TTL = 3600  # Seconds, shared Redis copy
+MODELS_LOCAL_CACHE_TTL = int(os.getenv("MODELS_LOCAL_CACHE_TTL", "60"))  # Seconds
+MODELS_REDIS_KEY = "openrouter:image_models"
+MODELS_REDIS_LOCK_KEY = "openrouter:image_models:refresh"
+MODELS_REDIS_LOCK_TTL = 60  # Seconds, only reached if the holder dies mid-refresh
+# Compare-and-delete, so a holder that outlived its TTL can't drop someone else's lock
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
 _models_cache = None
 _models_cache_timestamp = None
+_models_refresh_lock: Optional[asyncio.Lock] = None  # Created on first use, inside the running loop
+_redis: Optional[aioredis.Redis] = None
+
+
+def _models_cache_fresh() -> bool:
+    return bool(
+        _models_cache and _models_cache_timestamp
+        and (datetime.utcnow() - _models_cache_timestamp).total_seconds() < MODELS_LOCAL_CACHE_TTL
+    )
+
+
+def _get_redis() -> aioredis.Redis:
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"))
+    return _redis
+
+
+def _set_local_models_cache(models: List[Dict[str, Any]]) -> None:
+    global _models_cache, _models_cache_timestamp
+    _models_cache = models
+    _models_cache_timestamp = datetime.utcnow()
+
+
+async def _read_shared_models() -> Optional[List[Dict[str, Any]]]:
+    """Return the model list cached in Redis, or None on miss/unavailable."""
+    try:
+        blob = await _get_redis().get(MODELS_REDIS_KEY)
+    except Exception as e:
+        print(f"✗ Redis models cache unavailable: {e}")
+        return None
+    if not blob:
+        return None
+    models = orjson.loads(blob)
+    _set_local_models_cache(models)
+    return models
 
 
 async def fetch_openrouter_models() -> List[Dict[str, Any]]:
@@ -26,53 +82,104 @@ async def fetch_openrouter_models() -> List[Dict[str, Any]]:
     Returns:
         List of models that support image generation
     """
-    global _models_cache, _models_cache_timestamp
+    global _models_refresh_lock
 
     # Use cache if less than 1 hour old
-    if _models_cache and _models_cache_timestamp:
-        if (datetime.utcnow() - _models_cache_timestamp).seconds < 3600:
+    if _models_cache_fresh():
+        return _models_cache
+
+    # Single-flight: concurrent callers on a stale cache wait for one fetch
+    if _models_refresh_lock is None:
+        _models_refresh_lock = asyncio.Lock()
+    async with _models_refresh_lock:
+        if _models_cache_fresh():
             return _models_cache
 
+        models = await _read_shared_models()
+        if models is not None:
+            return models
+
+        # Cluster-wide single-flight: one process refreshes, the rest wait
+        # for it to publish (or give up) before falling back to their own fetch.
+        token = uuid.uuid4().hex
+        try:
+            won = await _get_redis().set(
+                MODELS_REDIS_LOCK_KEY, token, nx=True, ex=MODELS_REDIS_LOCK_TTL
+            )
+        except Exception:
+            won, token = True, None
+        if not won:
+            for _ in range(10):
+                await asyncio.sleep(0.5)
+                models = await _read_shared_models()
+                if models is not None:
+                    return models
+                # Lock released without a published list: the refresh just failed,
+                # so serve the fallback (uncached) instead of hitting OpenRouter again
+                try:
+                    lock_held = await _get_redis().exists(MODELS_REDIS_LOCK_KEY)
+                except Exception:
+                    break
+                if not lock_held:
+                    return get_fallback_models()
+            return await _refresh_openrouter_models()
+
+        try:
+            return await _refresh_openrouter_models()
+        finally:
+            if token is not None:
+                await _release_models_refresh_lock(token)
+
+
+async def _release_models_refresh_lock(token: str) -> None:
+    """Delete the refresh lock if this process still holds it."""
+    try:
+        await _get_redis().eval(_RELEASE_LOCK_SCRIPT, 1, MODELS_REDIS_LOCK_KEY, token)
+    except Exception as e:
+        print(f"✗ Failed to release models refresh lock: {e}")
+
+
+async def _refresh_openrouter_models() -> List[Dict[str, Any]]:
+    """Fetch the model list from OpenRouter and update both caches."""
+
     api_key = os.getenv("OPENROUTER_API_KEY")
     if not api_key:
         raise ValueError("OPENROUTER_API_KEY not configured")
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(
-                "https://openrouter.ai/api/v1/models",
-                headers={
-                    "Authorization": f"Bearer {api_key}"
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-
-            # Filter models that support image generation
-            # According to OpenRouter docs: models with "image" in architecture.output_modalities
-            image_models = []
-            for model in data.get("data", []):
-                # Check architecture.output_modalities field
-                architecture = model.get("architecture", {})
-                output_modalities = architecture.get("output_modalities", [])
-
-                # Include models that have "image" in their output_modalities
-                if "image" in output_modalities:
-                    image_models.append({
-                        "id": model["id"],
-                        "name": model.get("name", model["id"]),
-                        "description": model.get("description", ""),
-                        "context_length": model.get("context_length", 0),
-                        "pricing": model.get("pricing", {}),
-                        "created": model.get("created", 0),
-                        "output_modalities": output_modalities
-                    })
-
-            # Update cache
-            _models_cache = image_models
-            _models_cache_timestamp = datetime.utcnow()
-
-            return image_models
+        response = await _http_client.get(
+            "https://openrouter.ai/api/v1/models",
+            headers={
+                "Authorization": f"Bearer {api_key}"
+            }
+        )
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+
+        # Filter models that support image generation
+        # According to OpenRouter docs: models with "image" in architecture.output_modalities
+        image_models = [
+            {
+                "id": model["id"],
+                "name": model.get("name", model["id"]),
+                "description": model.get("description", ""),
+                "context_length": model.get("context_length", 0),
+                "pricing": model.get("pricing", {}),
+                "created": model.get("created", 0),
+                "output_modalities": output_modalities
+            }
+            for model in data.get("data", [])
+            if "image" in (output_modalities := model.get("architecture", {}).get("output_modalities", []))
+        ]
+
+        # Update cache
+        _set_local_models_cache(image_models)
+        try:
+            await _get_redis().set(MODELS_REDIS_KEY, orjson.dumps(image_models), ex=MODELS_CACHE_TTL)
+        except Exception as e:
+            print(f"✗ Failed to publish models to Redis: {e}")
+
+        return image_models
 
     except Exception as e:
         # Return fallback models if API fails
@@ -143,16 +250,15 @@ async def generate_image_openrouter(
             print(f"Converting to base64: {internal_url}")
 
             try:
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    response = await client.get(internal_url)
-                    response.raise_for_status()
-                    image_bytes = response.content
-
-                    # Convert to base64 data URL
-                    b64_data = base64.b64encode(image_bytes).decode('utf-8')
-                    data_url = f"data:image/png;base64,{b64_data}"
-                    print(f"✓ Converted to base64 (length: {len(b64_data)} chars)")
-                    return data_url
+                response = await _http_client.get(internal_url)
+                response.raise_for_status()
+                image_bytes = response.content
+
+                # Convert to base64 data URL
+                b64_data = base64.b64encode(image_bytes).decode('utf-8')
+                data_url = f"data:image/png;base64,{b64_data}"
+                print(f"✓ Converted to base64 (length: {len(b64_data)} chars)")
+                return data_url
             except Exception as e:
                 print(f"✗ Failed to convert image to base64: {e}")
                 raise ValueError(f"Failed to fetch image: {str(e)}")
@@ -227,61 +333,61 @@ async def generate_image_openrouter(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-            data = response.json()
-
-            # Extract image from response
-            # According to OpenRouter docs: images are in message.images field
-            image_url = None
-            image_data = None
-
-            if "choices" in data and len(data["choices"]) > 0:
-                choice = data["choices"][0]
-                message = choice.get("message", {})
-
-                # Check for images field (OpenRouter format)
-                images = message.get("images", [])
-                if images and len(images) > 0:
-                    # Get first image
-                    first_image = images[0]
-                    if isinstance(first_image, dict):
-                        # Format: {"type": "image_url", "image_url": {"url": "data:image/png;base64,..."}}
-                        image_url_obj = first_image.get("image_url", {})
-                        if isinstance(image_url_obj, dict):
-                            image_url = image_url_obj.get("url")
-                        else:
-                            image_url = image_url_obj
-
-                # Fallback: check content field
-                if not image_url:
-                    content = message.get("content", "")
-                    if isinstance(content, list):
-                        for item in content:
-                            if isinstance(item, dict):
-                                if item.get("type") == "image_url":
-                                    image_url = item.get("image_url", {}).get("url")
-                                    break
-
-            if not image_url and not image_data:
-                raise ValueError(f"No image found in OpenRouter response. Response: {json.dumps(data)}")
-
-            return {
-                "image_url": image_url,
-                "image_data": image_data,
-                "model": model_name,
-                "prompt": prompt,
-                "aspect_ratio": aspect_ratio,
-                "quality": quality,
-                "style": style,
-                "usage": data.get("usage", {}),
-                "raw_response": data
-            }
+        response = await _http_client.post(
+            "https://openrouter.ai/api/v1/chat/completions",
+            headers=headers,
+            json=payload,
+            timeout=120.0
+        )
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+
+        # Extract image from response
+        # According to OpenRouter docs: images are in message.images field
+        image_url = None
+        image_data = None
+
+        if "choices" in data and len(data["choices"]) > 0:
+            choice = data["choices"][0]
+            message = choice.get("message", {})
+
+            # Check for images field (OpenRouter format)
+            images = message.get("images", [])
+            if images and len(images) > 0:
+                # Get first image
+                first_image = images[0]
+                if isinstance(first_image, dict):
+                    # Format: {"type": "image_url", "image_url": {"url": "data:image/png;base64,..."}}
+                    image_url_obj = first_image.get("image_url", {})
+                    if isinstance(image_url_obj, dict):
+                        image_url = image_url_obj.get("url")
+                    else:
+                        image_url = image_url_obj
+
+            # Fallback: check content field
+            if not image_url:
+                content = message.get("content", "")
+                if isinstance(content, list):
+                    for item in content:
+                        if isinstance(item, dict):
+                            if item.get("type") == "image_url":
+                                image_url = item.get("image_url", {}).get("url")
+                                break
+
+        if not image_url and not image_data:
+            raise ValueError(f"No image found in OpenRouter response. Response: {json.dumps(data)}")
+
+        return {
+            "image_url": image_url,
+            "image_data": image_data,
+            "model": model_name,
+            "prompt": prompt,
+            "aspect_ratio": aspect_ratio,
+            "quality": quality,
+            "style": style,
+            "usage": data.get("usage", {}),
+            "raw_response": data
+        }
 
     except httpx.HTTPStatusError as e:
         error_detail = e.response.text
@@ -375,14 +481,12 @@ async def download_and_store_image(
                 raise ValueError("Invalid data URL format")
         else:
             # Download from regular URL
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.get(image_url)
-                response.raise_for_status()
-                image_bytes = response.content
+            response = await _http_client.get(image_url, timeout=60.0)
+            response.raise_for_status()
+            image_bytes = response.content
 
         # Upload to MinIO
-        file_path = f"projects/{project_id}/images/{filename}"
-        file_url = upload_file(
+        file_url = await upload_file_async(
             file_data=image_bytes,
             file_name=filename,
             content_type="image/png",
@@ -429,8 +533,7 @@ async def store_base64_image(
         image_bytes = base64.b64decode(image_data)
 
         # Upload to MinIO
-        file_path = f"projects/{project_id}/images/{filename}"
-        file_url = upload_file(
+        file_url = await upload_file_async(
             file_data=image_bytes,
             file_name=filename,
             content_type="image/png",
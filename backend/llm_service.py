@@ -1,11 +1,36 @@
 import os
+import asyncio
+import random
 import httpx
-from typing import List, Dict, Any
+import orjson
+from typing import List, Dict, Any, Optional
 from fastapi import HTTPException
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
+# Retry policy for transient OpenRouter failures (rate limits / gateway errors)
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+MAX_RETRIES = 3
+MAX_RETRY_DELAY = 10.0  # Seconds; caps large Retry-After values
+
+# SSE framing, matched on raw bytes so lines are never decoded to str
+SSE_DATA_PREFIX = b"data: "
+SSE_DONE = b"[DONE]"
+SSE_READ_SIZE = 4096
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """Backoff delay for a retry, honoring Retry-After when the upstream sends it."""
+    delay = 2 ** attempt
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            pass
+    return min(delay, MAX_RETRY_DELAY) + random.random() * 0.25
+
 async def list_models():
     """
     Fetch available models from OpenRouter with pricing information.
@@ -47,7 +72,7 @@ async def list_models():
                 }
             )
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             # OpenRouter returns models with full data including pricing
             return data.get("data", [])
         except Exception as e:
@@ -95,21 +120,38 @@ async def chat_completion(
     if tools:
         payload["tools"] = tools
 
+    # Serialize once with orjson (httpx's json= goes through stdlib json)
+    body = orjson.dumps(payload)
+
     async with httpx.AsyncClient() as client:
         try:
-            response = await client.post(
-                f"{OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                    "HTTP-Referer": "https://xtyl.com",
-                    "X-Title": "XTYL Creativity Machine",
-                    "Content-Type": "application/json"
-                },
-                json=payload,
-                timeout=60.0
-            )
-            response.raise_for_status()
-            return response.json()
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    response = await client.post(
+                        f"{OPENROUTER_BASE_URL}/chat/completions",
+                        headers={
+                            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                            "HTTP-Referer": "https://xtyl.com",
+                            "X-Title": "XTYL Creativity Machine",
+                            "Content-Type": "application/json"
+                        },
+                        content=body,
+                        timeout=60.0
+                    )
+                except (httpx.ConnectError, httpx.ConnectTimeout):
+                    # Request never reached OpenRouter, safe to resend
+                    if attempt == MAX_RETRIES:
+                        raise
+                    await asyncio.sleep(_retry_delay(attempt))
+                    continue
+
+                if response.status_code in RETRYABLE_STATUS_CODES and attempt < MAX_RETRIES:
+                    print(f"OpenRouter returned {response.status_code}, retrying ({attempt + 1}/{MAX_RETRIES})")
+                    await asyncio.sleep(_retry_delay(attempt, response))
+                    continue
+
+                response.raise_for_status()
+                return orjson.loads(response.content)
         except httpx.HTTPStatusError as e:
             print(f"OpenRouter API Error: {e.response.text}")
             raise HTTPException(status_code=e.response.status_code, detail=f"OpenRouter API Error: {e.response.text}")
@@ -168,23 +210,30 @@ async def chat_completion_stream(
                     "X-Title": "XTYL Creativity Machine",
                     "Content-Type": "application/json"
                 },
-                json=payload
+                content=orjson.dumps(payload)
             ) as response:
                 response.raise_for_status()
 
-                # Read SSE stream from OpenRouter
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]  # Remove "data: " prefix
+                # Read SSE stream from OpenRouter, splitting lines at the byte level
+                buffer = bytearray()
+                async for raw in response.aiter_bytes(SSE_READ_SIZE):
+                    buffer += raw
+                    while (newline := buffer.find(b"\n")) >= 0:
+                        line = bytes(buffer[:newline]).rstrip(b"\r")
+                        del buffer[:newline + 1]
+
+                        # Skip comments/keep-alives and non-data fields
+                        if not line.startswith(SSE_DATA_PREFIX):
+                            continue
 
-                        if data.strip() == "[DONE]":
-                            break
+                        data = line[len(SSE_DATA_PREFIX):]
+                        if data.strip() == SSE_DONE:
+                            return
 
                         try:
-                            import json
-                            chunk = json.loads(data)
+                            chunk = orjson.loads(data)
                             yield chunk
-                        except json.JSONDecodeError:
+                        except orjson.JSONDecodeError:
                             continue
 
         except httpx.HTTPStatusError as e:
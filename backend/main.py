@@ -1,27 +1,86 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from database import engine, Base, warm_pool
+from models import ensure_log_partitions, PARTITION_CHECK_INTERVAL
+from ai_usage_service import flush_usage_logs
+from image_generation_service import fetch_openrouter_models
+from workspace_events import start_listener, stop_listener
+from text_splitting import shutdown_split_pool
 from routers import auth, workspaces, documents, chat, folders, activity, ai_usage, templates, image_generation, visual_assets
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+async def maintain_log_partitions():
+    """Keep creating the audit tables' upcoming monthly partitions while the worker runs."""
+    while True:
+        await asyncio.sleep(PARTITION_CHECK_INTERVAL)
+        await asyncio.to_thread(ensure_log_partitions, engine)
 
-app = FastAPI(title="XTYL Creativity Machine API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create tables once the worker starts (not at import time), off the event loop
+    await asyncio.to_thread(Base.metadata.create_all, bind=engine)
+    await asyncio.to_thread(ensure_log_partitions, engine)
+    partition_task = asyncio.create_task(maintain_log_partitions())
+    await asyncio.to_thread(warm_pool)
+    # Warm the image model list in the background so the first picker load is a cache hit
+    prewarm = asyncio.create_task(fetch_openrouter_models())
+    # Push workspace change notifications to SSE clients instead of having them poll
+    start_listener(asyncio.get_running_loop())
+    yield
+    prewarm.cancel()
+    partition_task.cancel()
+    await asyncio.to_thread(stop_listener)
+    # Don't lose usage records still waiting in the batch queue
+    await asyncio.to_thread(flush_usage_logs)
+    shutdown_split_pool()
+
+app = FastAPI(
+    title="XTYL Creativity Machine API",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
 
 # CORS Configuration
+# Browsers reject "*" together with allow_credentials, so origins must be explicit
 origins = [
     "http://localhost:3000",
     "http://localhost:8000",
 ]
 
+FRONTEND_URL = os.getenv("FRONTEND_URL")
+if FRONTEND_URL and FRONTEND_URL not in origins:
+    origins.append(FRONTEND_URL)
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=600,  # Let browsers cache preflight responses for 10 minutes
 )
 
+# Server-Sent Event streams must reach the client per event, so never compress them
+UNCOMPRESSED_PATHS = {"/chat/completion-stream"}
+UNCOMPRESSED_SUFFIXES = ("/events",)
+
+class JSONGZipMiddleware(GZipMiddleware):
+    """GZip large responses (model lists, document lists) except SSE streams."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and (
+            scope["path"] in UNCOMPRESSED_PATHS or scope["path"].endswith(UNCOMPRESSED_SUFFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(JSONGZipMiddleware, minimum_size=1024, compresslevel=5)
+
 app.include_router(auth.router)
 app.include_router(workspaces.router)
 app.include_router(documents.router)
@@ -63,7 +122,6 @@ async def health_check():
     # Check Redis
     try:
         import redis
-        import os
         redis_url = os.getenv("REDIS_URL", "redis://redis:6379/0")
         r = redis.from_url(redis_url)
         r.ping()
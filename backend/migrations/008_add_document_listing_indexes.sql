@@ -0,0 +1,9 @@
+-- Migration: Add composite indexes for document listings
+-- Description: Covers the (project, folder, deleted) and (project, asset flag, asset type) filters used by list endpoints
+-- Date: 2025-01-24
+
+-- Project documents / folder contents, active vs archived
+CREATE INDEX IF NOT EXISTS idx_documents_project_folder_active ON documents(project_id, folder_id, deleted_at);
+
+-- Visual asset library filtered by type
+CREATE INDEX IF NOT EXISTS idx_documents_project_assets ON documents(project_id, is_reference_asset, asset_type);
@@ -0,0 +1,67 @@
+-- Migration: Store primary and foreign keys as native UUID
+-- Description: Converts VARCHAR id columns (36 bytes + header) to 16-byte UUID, shrinking PK/FK indexes and joins
+-- Date: 2025-01-24
+
+BEGIN;
+
+-- Drop foreign keys so referenced and referencing columns can change type together
+ALTER TABLE workspace_users DROP CONSTRAINT IF EXISTS workspace_users_workspace_id_fkey;
+ALTER TABLE workspace_users DROP CONSTRAINT IF EXISTS workspace_users_user_id_fkey;
+ALTER TABLE projects DROP CONSTRAINT IF EXISTS projects_workspace_id_fkey;
+ALTER TABLE folders DROP CONSTRAINT IF EXISTS folders_parent_folder_id_fkey;
+ALTER TABLE folders DROP CONSTRAINT IF EXISTS folders_project_id_fkey;
+ALTER TABLE documents DROP CONSTRAINT IF EXISTS documents_project_id_fkey;
+ALTER TABLE documents DROP CONSTRAINT IF EXISTS documents_folder_id_fkey;
+ALTER TABLE activity_log DROP CONSTRAINT IF EXISTS activity_log_user_id_fkey;
+ALTER TABLE ai_usage_log DROP CONSTRAINT IF EXISTS ai_usage_log_user_id_fkey;
+ALTER TABLE ai_usage_log DROP CONSTRAINT IF EXISTS ai_usage_log_workspace_id_fkey;
+ALTER TABLE ai_usage_log DROP CONSTRAINT IF EXISTS ai_usage_log_project_id_fkey;
+ALTER TABLE templates DROP CONSTRAINT IF EXISTS templates_workspace_id_fkey;
+ALTER TABLE templates DROP CONSTRAINT IF EXISTS templates_user_id_fkey;
+
+-- Convert key columns
+ALTER TABLE users ALTER COLUMN id TYPE UUID USING id::uuid;
+ALTER TABLE workspaces ALTER COLUMN id TYPE UUID USING id::uuid;
+ALTER TABLE workspace_users
+    ALTER COLUMN workspace_id TYPE UUID USING workspace_id::uuid,
+    ALTER COLUMN user_id TYPE UUID USING user_id::uuid;
+ALTER TABLE projects
+    ALTER COLUMN id TYPE UUID USING id::uuid,
+    ALTER COLUMN workspace_id TYPE UUID USING workspace_id::uuid;
+ALTER TABLE folders
+    ALTER COLUMN id TYPE UUID USING id::uuid,
+    ALTER COLUMN parent_folder_id TYPE UUID USING parent_folder_id::uuid,
+    ALTER COLUMN project_id TYPE UUID USING project_id::uuid;
+ALTER TABLE documents
+    ALTER COLUMN id TYPE UUID USING id::uuid,
+    ALTER COLUMN project_id TYPE UUID USING project_id::uuid,
+    ALTER COLUMN folder_id TYPE UUID USING folder_id::uuid;
+ALTER TABLE activity_log
+    ALTER COLUMN id TYPE UUID USING id::uuid,
+    ALTER COLUMN user_id TYPE UUID USING user_id::uuid;
+ALTER TABLE ai_usage_log
+    ALTER COLUMN id TYPE UUID USING id::uuid,
+    ALTER COLUMN user_id TYPE UUID USING user_id::uuid,
+    ALTER COLUMN workspace_id TYPE UUID USING workspace_id::uuid,
+    ALTER COLUMN project_id TYPE UUID USING project_id::uuid;
+ALTER TABLE templates
+    ALTER COLUMN id TYPE UUID USING id::uuid,
+    ALTER COLUMN workspace_id TYPE UUID USING workspace_id::uuid,
+    ALTER COLUMN user_id TYPE UUID USING user_id::uuid;
+
+-- Restore foreign keys
+ALTER TABLE workspace_users ADD CONSTRAINT workspace_users_workspace_id_fkey FOREIGN KEY (workspace_id) REFERENCES workspaces(id);
+ALTER TABLE workspace_users ADD CONSTRAINT workspace_users_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id);
+ALTER TABLE projects ADD CONSTRAINT projects_workspace_id_fkey FOREIGN KEY (workspace_id) REFERENCES workspaces(id);
+ALTER TABLE folders ADD CONSTRAINT folders_parent_folder_id_fkey FOREIGN KEY (parent_folder_id) REFERENCES folders(id);
+ALTER TABLE folders ADD CONSTRAINT folders_project_id_fkey FOREIGN KEY (project_id) REFERENCES projects(id);
+ALTER TABLE documents ADD CONSTRAINT documents_project_id_fkey FOREIGN KEY (project_id) REFERENCES projects(id);
+ALTER TABLE documents ADD CONSTRAINT documents_folder_id_fkey FOREIGN KEY (folder_id) REFERENCES folders(id);
+ALTER TABLE activity_log ADD CONSTRAINT activity_log_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id);
+ALTER TABLE ai_usage_log ADD CONSTRAINT ai_usage_log_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id);
+ALTER TABLE ai_usage_log ADD CONSTRAINT ai_usage_log_workspace_id_fkey FOREIGN KEY (workspace_id) REFERENCES workspaces(id);
+ALTER TABLE ai_usage_log ADD CONSTRAINT ai_usage_log_project_id_fkey FOREIGN KEY (project_id) REFERENCES projects(id);
+ALTER TABLE templates ADD CONSTRAINT templates_workspace_id_fkey FOREIGN KEY (workspace_id) REFERENCES workspaces(id);
+ALTER TABLE templates ADD CONSTRAINT templates_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id);
+
+COMMIT;
@@ -0,0 +1,106 @@
+-- Migration: Partition audit tables by month
+-- Description: Rebuilds activity_log and ai_usage_log as RANGE (created_at) partitioned tables with monthly children
+-- Date: 2025-01-24
+-- Note: the backend creates upcoming monthly partitions on startup (models.ensure_log_partitions).
+--       Retire old months with: ALTER TABLE activity_log DETACH PARTITION activity_log_yYYYYmMM;
+
+BEGIN;
+
+-- Move the existing tables aside (index names are global, so rename the ones we recreate)
+ALTER TABLE activity_log RENAME TO activity_log_old;
+ALTER TABLE activity_log_old RENAME CONSTRAINT activity_log_pkey TO activity_log_old_pkey;
+DROP INDEX IF EXISTS idx_activity_entity;
+DROP INDEX IF EXISTS idx_activity_user;
+DROP INDEX IF EXISTS idx_activity_created;
+DROP INDEX IF EXISTS idx_activity_actor_type;
+
+ALTER TABLE ai_usage_log RENAME TO ai_usage_log_old;
+ALTER TABLE ai_usage_log_old RENAME CONSTRAINT ai_usage_log_pkey TO ai_usage_log_old_pkey;
+
+-- Partitioned parents (the partition key must be part of the primary key)
+CREATE TABLE activity_log (
+    id UUID NOT NULL,
+    entity_type VARCHAR NOT NULL,
+    entity_id VARCHAR NOT NULL,
+    action VARCHAR NOT NULL,
+    actor_type VARCHAR NOT NULL,
+    user_id UUID REFERENCES users(id),
+    changes JSONB,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE ai_usage_log (
+    id UUID NOT NULL,
+    user_id UUID NOT NULL REFERENCES users(id),
+    workspace_id UUID REFERENCES workspaces(id),
+    project_id UUID REFERENCES projects(id),
+    model VARCHAR NOT NULL,
+    provider VARCHAR NOT NULL,
+    request_type VARCHAR NOT NULL,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    input_cost NUMERIC(10, 6) NOT NULL DEFAULT 0,
+    output_cost NUMERIC(10, 6) NOT NULL DEFAULT 0,
+    total_cost NUMERIC(10, 6) NOT NULL DEFAULT 0,
+    prompt_preview TEXT,
+    response_preview TEXT,
+    tool_calls JSONB,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    duration_ms INTEGER,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE activity_log_default PARTITION OF activity_log DEFAULT;
+CREATE TABLE ai_usage_log_default PARTITION OF ai_usage_log DEFAULT;
+
+-- Monthly partitions from the oldest existing row through two months ahead
+DO $$
+DECLARE
+    tbl TEXT;
+    month_start DATE;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY['activity_log', 'ai_usage_log'] LOOP
+        EXECUTE format('SELECT date_trunc(''month'', COALESCE(MIN(created_at), NOW()))::date FROM %I', tbl || '_old')
+            INTO month_start;
+        WHILE month_start <= date_trunc('month', NOW() + INTERVAL '2 months')::date LOOP
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                tbl || '_' || to_char(month_start, '"y"YYYY"m"MM'),
+                tbl,
+                month_start,
+                (month_start + INTERVAL '1 month')::date
+            );
+            month_start := (month_start + INTERVAL '1 month')::date;
+        END LOOP;
+    END LOOP;
+END $$;
+
+-- Copy existing rows
+INSERT INTO activity_log (id, entity_type, entity_id, action, actor_type, user_id, changes, created_at)
+SELECT id, entity_type, entity_id, action, actor_type, user_id, changes, COALESCE(created_at, NOW())
+FROM activity_log_old;
+
+INSERT INTO ai_usage_log (
+    id, user_id, workspace_id, project_id, model, provider, request_type,
+    input_tokens, output_tokens, total_tokens, input_cost, output_cost, total_cost,
+    prompt_preview, response_preview, tool_calls, created_at, duration_ms
+)
+SELECT
+    id, user_id, workspace_id, project_id, model, provider, request_type,
+    input_tokens, output_tokens, total_tokens, input_cost, output_cost, total_cost,
+    prompt_preview, response_preview, tool_calls, COALESCE(created_at, NOW()), duration_ms
+FROM ai_usage_log_old;
+
+DROP TABLE activity_log_old;
+DROP TABLE ai_usage_log_old;
+
+-- Indexes on the parent are created on every partition
+CREATE INDEX IF NOT EXISTS idx_activity_entity ON activity_log(entity_type, entity_id);
+CREATE INDEX IF NOT EXISTS idx_activity_user ON activity_log(user_id);
+CREATE INDEX IF NOT EXISTS idx_activity_created ON activity_log(created_at);
+CREATE INDEX IF NOT EXISTS idx_ai_usage_user_created ON ai_usage_log(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_ai_usage_workspace_created ON ai_usage_log(workspace_id, created_at);
+
+COMMIT;
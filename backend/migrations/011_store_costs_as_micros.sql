@@ -0,0 +1,24 @@
+-- Migration: Store AI usage costs as integer micro-USD
+-- Description: Replaces NUMERIC(10,6) cost columns with BIGINT micro-USD (1 USD = 1,000,000) for smaller rows and integer aggregation
+-- Date: 2025-01-24
+
+BEGIN;
+
+ALTER TABLE ai_usage_log
+ADD COLUMN IF NOT EXISTS input_cost_micros BIGINT NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS output_cost_micros BIGINT NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS total_cost_micros BIGINT NOT NULL DEFAULT 0;
+
+UPDATE ai_usage_log SET
+    input_cost_micros = ROUND(input_cost * 1000000)::bigint,
+    output_cost_micros = ROUND(output_cost * 1000000)::bigint,
+    total_cost_micros = ROUND(total_cost * 1000000)::bigint;
+
+ALTER TABLE ai_usage_log
+DROP COLUMN IF EXISTS input_cost,
+DROP COLUMN IF EXISTS output_cost,
+DROP COLUMN IF EXISTS total_cost;
+
+COMMIT;
+
+COMMENT ON COLUMN ai_usage_log.total_cost_micros IS 'Total cost in micro-USD (divide by 1,000,000 for USD)';
@@ -0,0 +1,8 @@
+-- Migration: Add trigram indexes for partial-match search
+-- Description: GIN pg_trgm indexes so ILIKE '%term%' on template names and document titles can use an index
+-- Date: 2025-01-24
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_templates_name_trgm ON templates USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_documents_title_trgm ON documents USING GIN (title gin_trgm_ops);
@@ -0,0 +1,9 @@
+-- Migration: Use lz4 TOAST compression for document content
+-- Description: Markdown bodies are TOASTed once large; lz4 (Postgres 14+) is faster to compress/decompress than pglz
+-- Date: 2025-01-24
+
+ALTER TABLE documents ALTER COLUMN content SET COMPRESSION lz4;
+
+-- Existing values keep pglz until they are rewritten. To recompress everything at once
+-- (takes a lock and rewrites the table), run during a maintenance window:
+--   VACUUM FULL documents;
@@ -0,0 +1,13 @@
+-- Migration: Compute AI usage totals in the database
+-- Description: total_tokens and total_cost_micros become STORED generated columns so they can never disagree with their parts
+-- Date: 2025-01-24
+
+BEGIN;
+
+ALTER TABLE ai_usage_log DROP COLUMN IF EXISTS total_tokens;
+ALTER TABLE ai_usage_log ADD COLUMN total_tokens INTEGER GENERATED ALWAYS AS (input_tokens + output_tokens) STORED;
+
+ALTER TABLE ai_usage_log DROP COLUMN IF EXISTS total_cost_micros;
+ALTER TABLE ai_usage_log ADD COLUMN total_cost_micros BIGINT GENERATED ALWAYS AS (input_cost_micros + output_cost_micros) STORED;
+
+COMMIT;
@@ -0,0 +1,8 @@
+-- Migration: Use jsonb_path_ops for the asset metadata GIN index
+-- Description: Tag filters now use JSONB containment (@>), which jsonb_path_ops serves with a smaller index than jsonb_ops
+-- Date: 2025-01-24
+
+CREATE INDEX IF NOT EXISTS idx_documents_asset_metadata_path ON documents USING GIN (asset_metadata jsonb_path_ops) WHERE asset_metadata IS NOT NULL;
+
+-- Replaced by the index above
+DROP INDEX IF EXISTS idx_documents_asset_metadata;
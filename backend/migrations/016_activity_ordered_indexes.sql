@@ -0,0 +1,14 @@
+-- Migration: Ordered composite indexes for activity lists
+-- Description: Entity history and per-user activity filter on a key and sort by created_at DESC;
+--              indexing both lets Postgres read rows pre-sorted and stop at the LIMIT
+-- Date: 2025-01-24
+
+CREATE INDEX IF NOT EXISTS idx_activity_entity_created ON activity_log(entity_type, entity_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_activity_user_created ON activity_log(user_id, created_at DESC);
+
+-- Covered as prefixes of the indexes above
+DROP INDEX IF EXISTS idx_activity_entity;
+DROP INDEX IF EXISTS idx_activity_user;
+
+-- Duplicates the index backing the share_token UNIQUE constraint
+DROP INDEX IF EXISTS idx_documents_share_token;
@@ -0,0 +1,46 @@
+-- Migration: Trigger-maintained daily AI usage rollup
+-- Description: ai_usage_daily holds per-day request/token/cost totals per (user, workspace, project),
+--              updated by an AFTER INSERT trigger on ai_usage_log so the trend chart doesn't group raw rows
+-- Date: 2025-01-24
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ai_usage_daily (
+    id BIGSERIAL PRIMARY KEY,
+    day DATE NOT NULL,
+    user_id UUID NOT NULL,
+    workspace_id UUID,
+    project_id UUID,
+    requests INTEGER NOT NULL DEFAULT 0,
+    total_tokens BIGINT NOT NULL DEFAULT 0,
+    total_cost_micros BIGINT NOT NULL DEFAULT 0,
+    CONSTRAINT uq_ai_usage_daily_scope UNIQUE NULLS NOT DISTINCT (day, user_id, workspace_id, project_id)
+);
+
+CREATE OR REPLACE FUNCTION ai_usage_daily_agg() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO ai_usage_daily (day, user_id, workspace_id, project_id, requests, total_tokens, total_cost_micros)
+    VALUES (
+        NEW.created_at::date, NEW.user_id, NEW.workspace_id, NEW.project_id, 1,
+        NEW.input_tokens + NEW.output_tokens, NEW.input_cost_micros + NEW.output_cost_micros
+    )
+    ON CONFLICT ON CONSTRAINT uq_ai_usage_daily_scope DO UPDATE SET
+        requests = ai_usage_daily.requests + 1,
+        total_tokens = ai_usage_daily.total_tokens + EXCLUDED.total_tokens,
+        total_cost_micros = ai_usage_daily.total_cost_micros + EXCLUDED.total_cost_micros;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS ai_usage_daily_trg ON ai_usage_log;
+CREATE TRIGGER ai_usage_daily_trg AFTER INSERT ON ai_usage_log
+    FOR EACH ROW EXECUTE FUNCTION ai_usage_daily_agg();
+
+-- Backfill from existing rows
+TRUNCATE ai_usage_daily;
+INSERT INTO ai_usage_daily (day, user_id, workspace_id, project_id, requests, total_tokens, total_cost_micros)
+SELECT created_at::date, user_id, workspace_id, project_id, COUNT(*), SUM(total_tokens), SUM(total_cost_micros)
+FROM ai_usage_log
+GROUP BY created_at::date, user_id, workspace_id, project_id;
+
+COMMIT;
@@ -0,0 +1,32 @@
+-- Migration: Database-level cascades for the workspace hierarchy
+-- Description: Let Postgres remove memberships, projects, folders and documents when their parent
+--              row is deleted, so the ORM no longer loads children (passive_deletes) to clean up
+-- Date: 2025-01-24
+
+ALTER TABLE workspace_users DROP CONSTRAINT IF EXISTS workspace_users_workspace_id_fkey;
+ALTER TABLE workspace_users ADD CONSTRAINT workspace_users_workspace_id_fkey
+    FOREIGN KEY (workspace_id) REFERENCES workspaces(id) ON DELETE CASCADE;
+
+ALTER TABLE workspace_users DROP CONSTRAINT IF EXISTS workspace_users_user_id_fkey;
+ALTER TABLE workspace_users ADD CONSTRAINT workspace_users_user_id_fkey
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;
+
+ALTER TABLE projects DROP CONSTRAINT IF EXISTS projects_workspace_id_fkey;
+ALTER TABLE projects ADD CONSTRAINT projects_workspace_id_fkey
+    FOREIGN KEY (workspace_id) REFERENCES workspaces(id) ON DELETE CASCADE;
+
+ALTER TABLE folders DROP CONSTRAINT IF EXISTS folders_parent_folder_id_fkey;
+ALTER TABLE folders ADD CONSTRAINT folders_parent_folder_id_fkey
+    FOREIGN KEY (parent_folder_id) REFERENCES folders(id) ON DELETE CASCADE;
+
+ALTER TABLE folders DROP CONSTRAINT IF EXISTS folders_project_id_fkey;
+ALTER TABLE folders ADD CONSTRAINT folders_project_id_fkey
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE;
+
+ALTER TABLE documents DROP CONSTRAINT IF EXISTS documents_project_id_fkey;
+ALTER TABLE documents ADD CONSTRAINT documents_project_id_fkey
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE;
+
+ALTER TABLE documents DROP CONSTRAINT IF EXISTS documents_folder_id_fkey;
+ALTER TABLE documents ADD CONSTRAINT documents_folder_id_fkey
+    FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE CASCADE;
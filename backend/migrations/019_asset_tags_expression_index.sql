@@ -0,0 +1,9 @@
+-- Migration: Path-specific GIN index for asset tag filters
+-- Description: The asset library only filters on asset_metadata->'tags', so index that path alone
+--              instead of the whole metadata document; the index is a fraction of the size
+-- Date: 2025-01-24
+
+CREATE INDEX IF NOT EXISTS idx_documents_asset_tags_path ON documents USING GIN ((asset_metadata -> 'tags') jsonb_path_ops) WHERE asset_metadata IS NOT NULL;
+
+-- Replaced by the index above
+DROP INDEX IF EXISTS idx_documents_asset_metadata_path;
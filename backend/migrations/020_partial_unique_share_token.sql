@@ -0,0 +1,12 @@
+-- Migration: Partial unique index for document share tokens
+-- Description: Only shared documents have a share_token; a partial unique index skips the NULL rows,
+--              replaces the full-table unique constraint and the two plain indexes on the column,
+--              and still serves the public /shared/{token} lookup
+-- Date: 2025-01-24
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_documents_share_token ON documents(share_token) WHERE share_token IS NOT NULL;
+
+-- Replaced by the index above
+ALTER TABLE documents DROP CONSTRAINT IF EXISTS documents_share_token_key;
+DROP INDEX IF EXISTS idx_documents_share_token;
+DROP INDEX IF EXISTS ix_documents_share_token;
@@ -0,0 +1,39 @@
+-- Migration: NOTIFY listeners when a workspace's projects or documents change
+-- Description: Triggers publish the workspace id on the workspace_changes channel; API processes
+--              LISTEN and push it to clients over SSE, replacing the sidebar's 5-second polling
+-- Date: 2025-01-24
+
+CREATE OR REPLACE FUNCTION notify_workspace_change() RETURNS trigger AS $$
+DECLARE
+    changed RECORD;
+    ws UUID;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+
+    IF TG_TABLE_NAME = 'projects' THEN
+        ws := changed.workspace_id;
+    ELSE
+        SELECT workspace_id INTO ws FROM projects WHERE id = changed.project_id;
+    END IF;
+
+    IF ws IS NOT NULL THEN
+        PERFORM pg_notify('workspace_changes', ws::text);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS projects_notify_workspace ON projects;
+CREATE TRIGGER projects_notify_workspace
+    AFTER INSERT OR DELETE OR UPDATE OF name, workspace_id ON projects
+    FOR EACH ROW EXECUTE FUNCTION notify_workspace_change();
+
+DROP TRIGGER IF EXISTS documents_notify_workspace ON documents;
+CREATE TRIGGER documents_notify_workspace
+    AFTER INSERT OR DELETE OR UPDATE OF title, status, folder_id, deleted_at, media_type,
+        thumbnail_url, is_reference_asset, asset_type ON documents
+    FOR EACH ROW EXECUTE FUNCTION notify_workspace_change();
@@ -0,0 +1,16 @@
+-- Migration: HNSW index for knowledge base similarity search
+-- Description: Without a vector index every RAG query sequentially scans langchain_pg_embedding.
+--              HNSW needs a fixed dimension, so the column is pinned to the 1536-d embedding model first.
+-- Date: 2025-01-24
+
+ALTER TABLE langchain_pg_embedding ALTER COLUMN embedding TYPE vector(1536);
+
+SET maintenance_work_mem = '2GB';
+SET max_parallel_maintenance_workers = 7;
+
+DROP INDEX IF EXISTS idx_lc_embedding_hnsw;
+CREATE INDEX idx_lc_embedding_hnsw ON langchain_pg_embedding
+    USING hnsw (embedding vector_cosine_ops) WITH (m = 24, ef_construction = 128);
+
+RESET maintenance_work_mem;
+RESET max_parallel_maintenance_workers;
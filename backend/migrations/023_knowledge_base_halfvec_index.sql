@@ -0,0 +1,17 @@
+-- Migration: Half-precision HNSW index for knowledge base search
+-- Description: Index embedding::halfvec(1536) with halfvec_cosine_ops instead of the fp32 column.
+--              The graph is half the size, so more of it stays in shared_buffers; rows keep fp32 precision.
+--              Requires pgvector >= 0.7.
+-- Date: 2025-01-24
+
+SET maintenance_work_mem = '2GB';
+SET max_parallel_maintenance_workers = 7;
+
+CREATE INDEX IF NOT EXISTS idx_lc_embedding_hnsw_half ON langchain_pg_embedding
+    USING hnsw ((embedding::halfvec(1536)) halfvec_cosine_ops) WITH (m = 24, ef_construction = 128);
+
+-- Replaced by the index above
+DROP INDEX IF EXISTS idx_lc_embedding_hnsw;
+
+RESET maintenance_work_mem;
+RESET max_parallel_maintenance_workers;
@@ -0,0 +1,19 @@
+-- Migration: Inner-product HNSW index over unit-length embeddings
+-- Description: Embeddings are now L2-normalized before insert, so inner product ranks the same as
+--              cosine distance and skips the norm computations on every comparison.
+--              Normalizes existing rows (pgvector >= 0.7 for l2_normalize) and swaps the index opclass.
+-- Date: 2025-01-24
+
+UPDATE langchain_pg_embedding SET embedding = l2_normalize(embedding);
+
+SET maintenance_work_mem = '2GB';
+SET max_parallel_maintenance_workers = 7;
+
+CREATE INDEX IF NOT EXISTS idx_lc_embedding_hnsw_half_ip ON langchain_pg_embedding
+    USING hnsw ((embedding::halfvec(1536)) halfvec_ip_ops) WITH (m = 24, ef_construction = 128);
+
+-- Replaced by the index above
+DROP INDEX IF EXISTS idx_lc_embedding_hnsw_half;
+
+RESET maintenance_work_mem;
+RESET max_parallel_maintenance_workers;
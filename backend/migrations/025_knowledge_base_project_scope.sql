@@ -0,0 +1,31 @@
+-- Migration: Project-scoped knowledge base search
+-- Description: Copy document_id/project_id out of the embedding metadata into indexed uuid columns
+--              (kept in sync by a trigger) so searches filter by project with a scalar predicate the
+--              planner can combine with the HNSW index, instead of a JSON lookup on every row
+-- Date: 2025-01-24
+
+ALTER TABLE langchain_pg_embedding
+    ADD COLUMN IF NOT EXISTS document_id uuid,
+    ADD COLUMN IF NOT EXISTS project_id uuid;
+
+CREATE OR REPLACE FUNCTION langchain_pg_embedding_scope() RETURNS trigger AS $$
+BEGIN
+    NEW.document_id := (NEW.cmetadata->>'document_id')::uuid;
+    NEW.project_id := (NEW.cmetadata->>'project_id')::uuid;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS langchain_pg_embedding_scope_trg ON langchain_pg_embedding;
+CREATE TRIGGER langchain_pg_embedding_scope_trg BEFORE INSERT ON langchain_pg_embedding
+    FOR EACH ROW EXECUTE FUNCTION langchain_pg_embedding_scope();
+
+CREATE INDEX IF NOT EXISTS idx_lc_embedding_project ON langchain_pg_embedding(project_id);
+CREATE INDEX IF NOT EXISTS idx_lc_embedding_document ON langchain_pg_embedding(document_id);
+
+-- Backfill existing rows; older chunks carry no project_id in their metadata
+UPDATE langchain_pg_embedding e
+SET document_id = d.id,
+    project_id = d.project_id
+FROM documents d
+WHERE d.id = (e.cmetadata->>'document_id')::uuid;
@@ -0,0 +1,15 @@
+-- Migration: Covering index for AI usage stats
+-- Description: Usage reports filter by user, optionally workspace/project, and a created_at window,
+--              then aggregate tokens and cost grouped by model/provider/request type. With every
+--              column they read in the index (INCLUDE), the stats and summary queries are served
+--              by an index-only scan without heap fetches. Created on the partitioned parent, so
+--              every monthly partition (existing and future) gets a matching index.
+--              Check with: EXPLAIN (ANALYZE, BUFFERS) on GET /ai-usage/summary's query -> "Index Only Scan"
+-- Date: 2025-01-24
+
+CREATE INDEX IF NOT EXISTS idx_ai_usage_user_scope_created
+    ON ai_usage_log(user_id, workspace_id, project_id, created_at DESC)
+    INCLUDE (model, provider, request_type, input_tokens, output_tokens, total_tokens, total_cost_micros);
+
+-- Index-only scans rely on the visibility map; refresh it for the existing rows
+VACUUM (ANALYZE) ai_usage_log;
@@ -4,10 +4,20 @@ Handles file upload, download, and management using MinIO
 """
 
 import os
+import asyncio
+import json
+import hashlib
 from minio import Minio
 from minio.error import S3Error
-from typing import Optional, BinaryIO
+from typing import BinaryIO, Union
+from concurrent.futures import Future, ThreadPoolExecutor
 import io
+import socket
+import ssl
+import certifi
+import threading
+import urllib3
+import time
 from datetime import timedelta
 
 # MinIO Configuration
@@ -18,62 +28,153 @@ MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
 MINIO_BUCKET = os.getenv("MINIO_BUCKET", "xtyl-storage")
 MINIO_SECURE = os.getenv("MINIO_SECURE", "false").lower() == "true"
 
+# Public read access: anyone can view/download files but not upload or delete
+_BUCKET_POLICY_JSON = json.dumps({
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Principal": {"AWS": "*"},
+            "Action": ["s3:GetObject"],
+            "Resource": [f"arn:aws:s3:::{MINIO_BUCKET}/*"]
+        }
+    ]
+})
+
+# Streaming configuration
+UPLOAD_PART_SIZE = int(os.getenv("MINIO_UPLOAD_PART_SIZE", str(10 * 1024 * 1024)))  # Multipart chunk size (min 5MB)
+UPLOAD_PARALLEL_PARTS = int(os.getenv("MINIO_UPLOAD_PARALLEL_PARTS", "4"))  # Parts uploaded concurrently
+
+# Background upload pipeline
+UPLOAD_WORKERS = int(os.getenv("MINIO_UPLOAD_WORKERS", "8"))  # Concurrent background uploads
+UPLOAD_MAX_ATTEMPTS = 3  # Attempts per upload before the error is surfaced
+LIST_WORKERS = int(os.getenv("MINIO_LIST_WORKERS", "16"))  # Folders listed concurrently by list_files
+
+# Uploaded objects get unique keys and are never rewritten in place, so browsers
+# and any CDN in front of the public bucket can cache them indefinitely
+PUBLIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_upload_pool = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="minio-upload")
+
+# Bucket setup runs once per process; failures leave the flag unset so the next call retries
+_bucket_ready = threading.Event()
+_bucket_lock = threading.Lock()
+
+# Connection pool configuration
+MINIO_POOL_SIZE = int(os.getenv("MINIO_POOL_SIZE", "64"))  # Keep-alive sockets kept open to MinIO
+
+# AES-GCM first so TLS bulk encryption uses AES-NI; ChaCha20 for CPUs without it
+tls_context = ssl.create_default_context(cafile=os.getenv("SSL_CERT_FILE") or certifi.where())
+tls_context.set_ciphers("ECDHE+AESGCM:ECDHE+CHACHA20")
+
+# Shared keep-alive pool so bursts of small requests reuse TCP/TLS connections
+http_client = urllib3.PoolManager(
+    num_pools=MINIO_POOL_SIZE,
+    maxsize=MINIO_POOL_SIZE,
+    retries=urllib3.Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=[500, 502, 503, 504]
+    ),
+    timeout=urllib3.Timeout(connect=3, read=30),
+    ssl_context=tls_context,
+    socket_options=[
+        (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    ]
+)
+
 # Initialize MinIO client
 minio_client = Minio(
     MINIO_ENDPOINT,
     access_key=MINIO_ACCESS_KEY,
     secret_key=MINIO_SECRET_KEY,
-    secure=MINIO_SECURE
+    secure=MINIO_SECURE,
+    http_client=http_client
 )
 
+class _BufferReader(io.RawIOBase):
+    """Read-only file-like view over an in-memory buffer without copying it."""
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview]):
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = min(len(buffer), len(self._view) - self._pos)
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        chunk = self._view[self._pos:end].tobytes()
+        self._pos = end
+        return chunk
+
+
 # Lazy bucket initialization - will be done on first use
 def ensure_bucket():
     """Ensure bucket exists and has public read access. Call this before using MinIO."""
-    try:
-        # Check if bucket exists, create if not
-        if not minio_client.bucket_exists(MINIO_BUCKET):
-            minio_client.make_bucket(MINIO_BUCKET)
-            print(f"✓ MinIO bucket '{MINIO_BUCKET}' created")
-        else:
-            print(f"✓ MinIO bucket '{MINIO_BUCKET}' exists")
-
-        # Set bucket policy to allow public read access
-        # This allows anyone to view/download files but not upload or delete
-        policy = {
-            "Version": "2012-10-17",
-            "Statement": [
-                {
-                    "Effect": "Allow",
-                    "Principal": {"AWS": "*"},
-                    "Action": ["s3:GetObject"],
-                    "Resource": [f"arn:aws:s3:::{MINIO_BUCKET}/*"]
-                }
-            ]
-        }
+    if _bucket_ready.is_set():
+        return
 
-        import json
-        minio_client.set_bucket_policy(MINIO_BUCKET, json.dumps(policy))
-        print(f"✓ MinIO bucket '{MINIO_BUCKET}' policy set to public read")
+    with _bucket_lock:
+        if _bucket_ready.is_set():
+            return
 
-    except Exception as e:
-        print(f"✗ MinIO bucket setup failed: {e}")
-        # Don't crash - let it fail on actual use if needed
+        try:
+            # Check if bucket exists, create if not
+            if not minio_client.bucket_exists(MINIO_BUCKET):
+                minio_client.make_bucket(MINIO_BUCKET)
+                print(f"✓ MinIO bucket '{MINIO_BUCKET}' created")
+            else:
+                print(f"✓ MinIO bucket '{MINIO_BUCKET}' exists")
+
+            # Set bucket policy to allow public read access
+            minio_client.set_bucket_policy(MINIO_BUCKET, _BUCKET_POLICY_JSON)
+            print(f"✓ MinIO bucket '{MINIO_BUCKET}' policy set to public read")
+
+            _bucket_ready.set()
+
+        except Exception as e:
+            print(f"✗ MinIO bucket setup failed: {e}")
+            # Don't crash - let it fail on actual use if needed
+
+
+def build_object_name(file_name: str, folder: str = "") -> str:
+    """
+    Build the object key for an upload
+
+    A short hash of the file name is inserted between the folder and the
+    file so objects in a hot folder (e.g. generated images) spread across
+    the key space instead of sharing one prefix.
+    """
+    shard = hashlib.blake2b(file_name.encode(), digest_size=2).hexdigest()
+    return f"{folder}/{shard}/{file_name}" if folder else f"{shard}/{file_name}"
 
 
 def upload_file(
-    file_data: bytes,
+    file_data: Union[bytes, bytearray, memoryview, BinaryIO],
     file_name: str,
     content_type: str = "application/octet-stream",
-    folder: str = ""
+    folder: str = "",
+    length: int = -1
 ) -> str:
     """
     Upload file to MinIO storage
 
     Args:
-        file_data: File content as bytes
+        file_data: File content as a bytes-like object or a readable binary stream
         file_name: Name of the file
         content_type: MIME type of the file
         folder: Optional folder path within bucket
+        length: Size of the stream in bytes (-1 if unknown). Ignored for bytes.
+            Objects larger than UPLOAD_PART_SIZE (or of unknown size) are sent
+            as a multipart upload with UPLOAD_PARALLEL_PARTS concurrent parts.
 
     Returns:
         Public URL of the uploaded file
@@ -85,20 +186,28 @@ def upload_file(
     ensure_bucket()
 
     try:
-        # Build object name with folder path
-        object_name = f"{folder}/{file_name}" if folder else file_name
+        object_name = build_object_name(file_name, folder)
 
-        # Convert bytes to file-like object
-        file_stream = io.BytesIO(file_data)
-        file_size = len(file_data)
+        if isinstance(file_data, (bytes, bytearray, memoryview)):
+            # In-memory payloads (thumbnails, generated images) are read
+            # through a memoryview instead of being copied into a BytesIO
+            file_stream = _BufferReader(file_data)
+            length = memoryview(file_data).nbytes
+        else:
+            # Stream straight from the caller's file object (e.g. UploadFile.file)
+            file_stream = file_data
 
-        # Upload to MinIO
+        # Upload to MinIO - the SDK reads part_size chunks and switches to
+        # multipart above one part, so memory stays bounded by the part size
         minio_client.put_object(
             MINIO_BUCKET,
             object_name,
             file_stream,
-            file_size,
-            content_type=content_type
+            length,
+            content_type=content_type,
+            metadata={"Cache-Control": PUBLIC_CACHE_CONTROL},
+            part_size=UPLOAD_PART_SIZE,
+            num_parallel_uploads=UPLOAD_PARALLEL_PARTS
         )
 
         # Generate public URL
@@ -205,10 +314,19 @@ def get_presigned_url(object_name: str, expires: int = 3600) -> str:
         raise Exception(f"URL generation error: {str(e)}")
 
 
+def _list_prefix(prefix: str) -> list:
+    """List every object under a prefix on a single connection."""
+    return [obj.object_name for obj in minio_client.list_objects(MINIO_BUCKET, prefix=prefix, recursive=True)]
+
+
 def list_files(prefix: str = "") -> list:
     """
     List files in MinIO storage
 
+    The top level under the prefix is listed first, then each sub-folder
+    (e.g. one per project) is listed recursively in parallel instead of
+    paging through the whole key space on one connection.
+
     Args:
         prefix: Optional prefix to filter files
 
@@ -222,8 +340,21 @@ def list_files(prefix: str = "") -> list:
         raise Exception("MinIO client not initialized")
 
     try:
-        objects = minio_client.list_objects(MINIO_BUCKET, prefix=prefix, recursive=True)
-        return [obj.object_name for obj in objects]
+        names = []
+        folders = []
+        for obj in minio_client.list_objects(MINIO_BUCKET, prefix=prefix, recursive=False):
+            if obj.is_dir:
+                folders.append(obj.object_name)
+            else:
+                names.append(obj.object_name)
+
+        if folders:
+            with ThreadPoolExecutor(max_workers=min(LIST_WORKERS, len(folders))) as pool:
+                for folder_names in pool.map(_list_prefix, folders):
+                    names.extend(folder_names)
+
+        names.sort()
+        return names
 
     except S3Error as e:
         raise Exception(f"MinIO list failed: {str(e)}")
@@ -247,5 +378,87 @@ def file_exists(object_name: str) -> bool:
     try:
         minio_client.stat_object(MINIO_BUCKET, object_name)
         return True
-    except:
+    except Exception:
         return False
+
+
+def _upload_with_retry(
+    file_data: Union[bytes, bytearray, memoryview, BinaryIO],
+    file_name: str,
+    content_type: str,
+    folder: str,
+    length: int
+) -> str:
+    """Run upload_file with exponential backoff between failed attempts."""
+    is_stream = not isinstance(file_data, (bytes, bytearray, memoryview))
+    start = file_data.tell() if is_stream and file_data.seekable() else None
+
+    for attempt in range(UPLOAD_MAX_ATTEMPTS):
+        try:
+            return upload_file(file_data, file_name, content_type, folder, length)
+        except Exception as e:
+            # A partially consumed stream can only be replayed if we can rewind it
+            if attempt == UPLOAD_MAX_ATTEMPTS - 1 or (is_stream and start is None):
+                raise
+            print(f"✗ MinIO upload attempt {attempt + 1} failed, retrying: {e}")
+            time.sleep(2 ** attempt)
+            if start is not None:
+                file_data.seek(start)
+
+
+def submit_upload(
+    file_data: Union[bytes, bytearray, memoryview, BinaryIO],
+    file_name: str,
+    content_type: str = "application/octet-stream",
+    folder: str = "",
+    length: int = -1
+) -> Future:
+    """
+    Queue an upload on the background pool and return immediately
+
+    The caller can keep preparing the next artifact while this one uploads,
+    and only call .result() when the public URL is actually needed.
+
+    Returns:
+        Future resolving to the public URL of the uploaded file
+    """
+    return _upload_pool.submit(_upload_with_retry, file_data, file_name, content_type, folder, length)
+
+
+# Async variants - run the blocking SDK calls in a worker thread so async
+# route handlers don't stall the event loop on MinIO network I/O
+
+async def upload_file_async(
+    file_data: Union[bytes, bytearray, memoryview, BinaryIO],
+    file_name: str,
+    content_type: str = "application/octet-stream",
+    folder: str = "",
+    length: int = -1
+) -> str:
+    """Async version of upload_file, run on the upload pool with retries"""
+    return await asyncio.wrap_future(submit_upload(file_data, file_name, content_type, folder, length))
+
+
+async def download_file_async(object_name: str) -> bytes:
+    """Async version of download_file"""
+    return await asyncio.to_thread(download_file, object_name)
+
+
+async def delete_file_async(object_name: str) -> bool:
+    """Async version of delete_file"""
+    return await asyncio.to_thread(delete_file, object_name)
+
+
+async def get_presigned_url_async(object_name: str, expires: int = 3600) -> str:
+    """Async version of get_presigned_url"""
+    return await asyncio.to_thread(get_presigned_url, object_name, expires)
+
+
+async def list_files_async(prefix: str = "") -> list:
+    """Async version of list_files"""
+    return await asyncio.to_thread(list_files, prefix)
+
+
+async def file_exists_async(object_name: str) -> bool:
+    """Async version of file_exists"""
+    return await asyncio.to_thread(file_exists, object_name)
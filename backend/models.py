@@ -1,29 +1,49 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime, Text, Numeric
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, Boolean, Date, DateTime, Text, Index, UniqueConstraint, Computed, DDL, event, text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.orm import relationship, backref
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.sql import func
 from database import Base
+from pricing_config import MICROS_PER_USD
+from datetime import date
+import os
+import time
 import uuid
 
+# Ids are stored as native 16-byte uuid columns but handled as strings in Python.
+# UUIDv7 puts a millisecond timestamp in the high bits, so new rows append to the
+# right edge of the primary key index instead of splitting random pages.
 def generate_uuid():
-    return str(uuid.uuid4())
+    timestamp_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (
+        (timestamp_ms & 0xFFFF_FFFF_FFFF) << 80
+        | 0x7 << 76                              # version
+        | ((rand >> 62) & 0xFFF) << 64           # rand_a
+        | 0b10 << 62                             # RFC 4122 variant
+        | rand & ((1 << 62) - 1)                 # rand_b
+    )
+    return str(uuid.UUID(int=value))
+
+# Relationships use lazy="raise_on_sql": walking one from a list endpoint would
+# issue a query per row, so callers must eager-load with selectinload() instead.
 
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(UUID(as_uuid=False), primary_key=True, default=generate_uuid)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     full_name = Column(String)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    workspaces = relationship("WorkspaceUser", back_populates="user")
+    workspaces = relationship("WorkspaceUser", back_populates="user", lazy="raise_on_sql", passive_deletes=True)
 
 class Workspace(Base):
     __tablename__ = "workspaces"
 
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(UUID(as_uuid=False), primary_key=True, default=generate_uuid)
     name = Column(String, index=True)
     description = Column(Text, nullable=True)
     default_text_model = Column(String, nullable=True)
@@ -32,56 +52,56 @@ class Workspace(Base):
     available_models = Column(JSONB, nullable=True, default=list)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    users = relationship("WorkspaceUser", back_populates="workspace")
-    projects = relationship("Project", back_populates="workspace")
+    users = relationship("WorkspaceUser", back_populates="workspace", lazy="raise_on_sql", passive_deletes=True)
+    projects = relationship("Project", back_populates="workspace", lazy="raise_on_sql", passive_deletes=True)
 
 class WorkspaceUser(Base):
     __tablename__ = "workspace_users"
 
-    workspace_id = Column(String, ForeignKey("workspaces.id"), primary_key=True)
-    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    workspace_id = Column(UUID(as_uuid=False), ForeignKey("workspaces.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(UUID(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
     role = Column(String, default="member") # owner, admin, member
 
-    workspace = relationship("Workspace", back_populates="users")
-    user = relationship("User", back_populates="workspaces")
+    workspace = relationship("Workspace", back_populates="users", lazy="raise_on_sql")
+    user = relationship("User", back_populates="workspaces", lazy="raise_on_sql")
 
 class Project(Base):
     __tablename__ = "projects"
 
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(UUID(as_uuid=False), primary_key=True, default=generate_uuid)
     name = Column(String, index=True)
     description = Column(Text, nullable=True)
-    workspace_id = Column(String, ForeignKey("workspaces.id"))
+    workspace_id = Column(UUID(as_uuid=False), ForeignKey("workspaces.id", ondelete="CASCADE"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    workspace = relationship("Workspace", back_populates="projects")
-    documents = relationship("Document", back_populates="project")
-    folders = relationship("Folder", back_populates="project")
+    workspace = relationship("Workspace", back_populates="projects", lazy="raise_on_sql")
+    documents = relationship("Document", back_populates="project", lazy="raise_on_sql", passive_deletes=True)
+    folders = relationship("Folder", back_populates="project", lazy="raise_on_sql", passive_deletes=True)
 
 class Folder(Base):
     __tablename__ = "folders"
 
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(UUID(as_uuid=False), primary_key=True, default=generate_uuid)
     name = Column(String, nullable=False)
-    parent_folder_id = Column(String, ForeignKey("folders.id"), nullable=True)
-    project_id = Column(String, ForeignKey("projects.id"), nullable=False)
+    parent_folder_id = Column(UUID(as_uuid=False), ForeignKey("folders.id", ondelete="CASCADE"), nullable=True)
+    project_id = Column(UUID(as_uuid=False), ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     deleted_at = Column(DateTime(timezone=True), nullable=True)
 
-    project = relationship("Project", back_populates="folders")
-    parent = relationship("Folder", remote_side=[id], backref="children")
-    documents = relationship("Document", back_populates="folder")
+    project = relationship("Project", back_populates="folders", lazy="raise_on_sql")
+    parent = relationship("Folder", remote_side=[id], backref=backref("children", lazy="raise_on_sql", passive_deletes=True), lazy="raise_on_sql")
+    documents = relationship("Document", back_populates="folder", lazy="raise_on_sql", passive_deletes=True)
 
 class Document(Base):
     __tablename__ = "documents"
 
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(UUID(as_uuid=False), primary_key=True, default=generate_uuid)
     title = Column(String)
     content = Column(Text) # Markdown content
     status = Column(String, default="draft") # draft, review, approved, production
-    project_id = Column(String, ForeignKey("projects.id"))
-    folder_id = Column(String, ForeignKey("folders.id"), nullable=True)
+    project_id = Column(UUID(as_uuid=False), ForeignKey("projects.id", ondelete="CASCADE"))
+    folder_id = Column(UUID(as_uuid=False), ForeignKey("folders.id", ondelete="CASCADE"), nullable=True)
 
     # Media fields for images and other file types
     media_type = Column(String, default="text")  # 'text', 'image', 'pdf'
@@ -96,37 +116,64 @@ class Document(Base):
 
     # Public sharing fields
     is_public = Column(Boolean, default=False)
-    share_token = Column(String, unique=True, nullable=True, index=True)
+    share_token = Column(String, nullable=True)  # Unique among shared documents, see __table_args__
     share_expires_at = Column(DateTime(timezone=True), nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     deleted_at = Column(DateTime(timezone=True), nullable=True)
 
-    project = relationship("Project", back_populates="documents")
-    folder = relationship("Folder", back_populates="documents")
+    project = relationship("Project", back_populates="documents", lazy="raise_on_sql")
+    folder = relationship("Folder", back_populates="documents", lazy="raise_on_sql")
+
+    __table_args__ = (
+        # Matches the project document/folder listings and the visual asset library filters
+        Index("idx_documents_project_folder_active", "project_id", "folder_id", "deleted_at"),
+        Index("idx_documents_project_assets", "project_id", "is_reference_asset", "asset_type"),
+        # Only shared documents carry a token, so keep the NULLs out of the unique index
+        Index("uq_documents_share_token", "share_token", unique=True, postgresql_where=text("share_token IS NOT NULL")),
+        # Trigram index so title ILIKE '%term%' searches don't scan the table
+        Index("idx_documents_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        # Only the tags path is ever filtered, so index just that subtree; jsonb_path_ops
+        # only supports @>, but is about half the size of the default GIN opclass
+        Index(
+            "idx_documents_asset_tags_path",
+            text("(asset_metadata -> 'tags') jsonb_path_ops"),
+            postgresql_using="gin",
+            postgresql_where=text("asset_metadata IS NOT NULL")
+        ),
+    )
 
 class ActivityLog(Base):
     __tablename__ = "activity_log"
 
-    id = Column(String, primary_key=True, default=generate_uuid)
+    id = Column(UUID(as_uuid=False), primary_key=True, default=generate_uuid)
     entity_type = Column(String, nullable=False)  # 'document', 'folder'
     entity_id = Column(String, nullable=False)
     action = Column(String, nullable=False)  # 'create', 'update', 'delete', 'restore', 'move'
     actor_type = Column(String, nullable=False)  # 'human', 'ai'
-    user_id = Column(String, ForeignKey("users.id"), nullable=True)
+    user_id = Column(UUID(as_uuid=False), ForeignKey("users.id"), nullable=True)
     changes = Column(JSONB, nullable=True)  # {before: {...}, after: {...}}
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), primary_key=True)  # Partition key
+
+    user = relationship("User", lazy="raise_on_sql")
 
-    user = relationship("User")
+    # Range-partitioned by month so inserts stay on the current partition's indexes
+    __table_args__ = (
+        # History and per-user lists read newest first, so the index returns rows already sorted
+        Index("idx_activity_entity_created", "entity_type", "entity_id", created_at.desc()),
+        Index("idx_activity_user_created", "user_id", created_at.desc()),
+        Index("idx_activity_created", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
 class AIUsageLog(Base):
     __tablename__ = "ai_usage_log"
 
-    id = Column(String, primary_key=True, default=generate_uuid)
-    user_id = Column(String, ForeignKey("users.id"), nullable=False)
-    workspace_id = Column(String, ForeignKey("workspaces.id"), nullable=True)
-    project_id = Column(String, ForeignKey("projects.id"), nullable=True)
+    id = Column(UUID(as_uuid=False), primary_key=True, default=generate_uuid)
+    user_id = Column(UUID(as_uuid=False), ForeignKey("users.id"), nullable=False)
+    workspace_id = Column(UUID(as_uuid=False), ForeignKey("workspaces.id"), nullable=True)
+    project_id = Column(UUID(as_uuid=False), ForeignKey("projects.id"), nullable=True)
 
     # Request details
     model = Column(String, nullable=False)
@@ -136,12 +183,12 @@ class AIUsageLog(Base):
     # Token usage
     input_tokens = Column(Integer, nullable=False, default=0)
     output_tokens = Column(Integer, nullable=False, default=0)
-    total_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, Computed("input_tokens + output_tokens", persisted=True))  # Maintained by Postgres
 
-    # Cost (in USD)
-    input_cost = Column(Numeric(10, 6), nullable=False, default=0.0)
-    output_cost = Column(Numeric(10, 6), nullable=False, default=0.0)
-    total_cost = Column(Numeric(10, 6), nullable=False, default=0.0)
+    # Cost (integer micro-USD; use the *_cost properties for USD)
+    input_cost_micros = Column(BigInteger, nullable=False, default=0)
+    output_cost_micros = Column(BigInteger, nullable=False, default=0)
+    total_cost_micros = Column(BigInteger, Computed("input_cost_micros + output_cost_micros", persisted=True))  # Maintained by Postgres
 
     # Context
     prompt_preview = Column(Text, nullable=True)  # First 500 chars
@@ -149,21 +196,73 @@ class AIUsageLog(Base):
     tool_calls = Column(JSONB, nullable=True)  # List of tools used
 
     # Metadata
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), primary_key=True)  # Partition key
     duration_ms = Column(Integer, nullable=True)  # Response time
 
     # Relationships
-    user = relationship("User")
-    workspace = relationship("Workspace")
-    project = relationship("Project")
+    user = relationship("User", lazy="raise_on_sql")
+    workspace = relationship("Workspace", lazy="raise_on_sql")
+    project = relationship("Project", lazy="raise_on_sql")
+
+    @hybrid_property
+    def input_cost(self):
+        return self.input_cost_micros / MICROS_PER_USD
+
+    @hybrid_property
+    def output_cost(self):
+        return self.output_cost_micros / MICROS_PER_USD
+
+    @hybrid_property
+    def total_cost(self):
+        return self.total_cost_micros / MICROS_PER_USD
+
+    # Range-partitioned by month; reports filter by owner and time window
+    __table_args__ = (
+        Index("idx_ai_usage_user_created", "user_id", "created_at"),
+        Index("idx_ai_usage_workspace_created", "workspace_id", "created_at"),
+        # Covers the stats/summary aggregations scoped to a workspace or project
+        # with an index-only scan (see migrations/026_ai_usage_covering_index.sql)
+        Index(
+            "idx_ai_usage_user_scope_created",
+            "user_id", "workspace_id", "project_id", created_at.desc(),
+            postgresql_include=[
+                "model", "provider", "request_type",
+                "input_tokens", "output_tokens", "total_tokens", "total_cost_micros",
+            ],
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+class AIUsageDaily(Base):
+    """Per-day usage totals, maintained by a trigger on ai_usage_log (never written by the app)."""
+    __tablename__ = "ai_usage_daily"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    user_id = Column(UUID(as_uuid=False), nullable=False)
+    workspace_id = Column(UUID(as_uuid=False), nullable=True)
+    project_id = Column(UUID(as_uuid=False), nullable=True)
+
+    requests = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(BigInteger, nullable=False, default=0)
+    total_cost_micros = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "day", "user_id", "workspace_id", "project_id",
+            name="uq_ai_usage_daily_scope",
+            postgresql_nulls_not_distinct=True
+        ),
+    )
 
 
 class Template(Base):
     __tablename__ = "templates"
 
-    id = Column(String, primary_key=True, default=generate_uuid)
-    workspace_id = Column(String, ForeignKey("workspaces.id"), nullable=True)  # Null = global/system template
-    user_id = Column(String, ForeignKey("users.id"), nullable=True)  # Who created (null for system templates)
+    id = Column(UUID(as_uuid=False), primary_key=True, default=generate_uuid)
+    workspace_id = Column(UUID(as_uuid=False), ForeignKey("workspaces.id"), nullable=True)  # Null = global/system template
+    user_id = Column(UUID(as_uuid=False), ForeignKey("users.id"), nullable=True)  # Who created (null for system templates)
 
     # Template details
     name = Column(String, nullable=False, index=True)
@@ -187,5 +286,181 @@ class Template(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
-    workspace = relationship("Workspace")
-    user = relationship("User")
+    workspace = relationship("Workspace", lazy="raise_on_sql")
+    user = relationship("User", lazy="raise_on_sql")
+
+    __table_args__ = (
+        Index("idx_templates_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+    )
+
+
+# Markdown bodies get large enough to be TOASTed; lz4 (Postgres 14+) compresses
+# and decompresses them much faster than the default pglz
+event.listen(
+    Document.__table__,
+    "after_create",
+    DDL("ALTER TABLE documents ALTER COLUMN content SET COMPRESSION lz4")
+)
+
+# Roll every usage row into ai_usage_daily as it is inserted
+AI_USAGE_DAILY_TRIGGER = DDL("""
+CREATE OR REPLACE FUNCTION ai_usage_daily_agg() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO ai_usage_daily (day, user_id, workspace_id, project_id, requests, total_tokens, total_cost_micros)
+    VALUES (
+        NEW.created_at::date, NEW.user_id, NEW.workspace_id, NEW.project_id, 1,
+        NEW.input_tokens + NEW.output_tokens, NEW.input_cost_micros + NEW.output_cost_micros
+    )
+    ON CONFLICT ON CONSTRAINT uq_ai_usage_daily_scope DO UPDATE SET
+        requests = ai_usage_daily.requests + 1,
+        total_tokens = ai_usage_daily.total_tokens + EXCLUDED.total_tokens,
+        total_cost_micros = ai_usage_daily.total_cost_micros + EXCLUDED.total_cost_micros;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS ai_usage_daily_trg ON ai_usage_log;
+CREATE TRIGGER ai_usage_daily_trg AFTER INSERT ON ai_usage_log
+    FOR EACH ROW EXECUTE FUNCTION ai_usage_daily_agg();
+""")
+event.listen(AIUsageLog.__table__, "after_create", AI_USAGE_DAILY_TRIGGER)
+
+# Tell listening API processes which workspace changed (see workspace_events.py).
+# Document content is left out so editor autosaves don't fan out to every client.
+WORKSPACE_CHANGE_NOTIFY = DDL("""
+CREATE OR REPLACE FUNCTION notify_workspace_change() RETURNS trigger AS $$
+DECLARE
+    changed RECORD;
+    ws UUID;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+
+    IF TG_TABLE_NAME = 'projects' THEN
+        ws := changed.workspace_id;
+    ELSE
+        SELECT workspace_id INTO ws FROM projects WHERE id = changed.project_id;
+    END IF;
+
+    IF ws IS NOT NULL THEN
+        PERFORM pg_notify('workspace_changes', ws::text);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS projects_notify_workspace ON projects;
+CREATE TRIGGER projects_notify_workspace
+    AFTER INSERT OR DELETE OR UPDATE OF name, workspace_id ON projects
+    FOR EACH ROW EXECUTE FUNCTION notify_workspace_change();
+
+DROP TRIGGER IF EXISTS documents_notify_workspace ON documents;
+CREATE TRIGGER documents_notify_workspace
+    AFTER INSERT OR DELETE OR UPDATE OF title, status, folder_id, deleted_at, media_type,
+        thumbnail_url, is_reference_asset, asset_type ON documents
+    FOR EACH ROW EXECUTE FUNCTION notify_workspace_change();
+""")
+event.listen(Document.__table__, "after_create", WORKSPACE_CHANGE_NOTIFY)
+
+
+# Trigram operator classes used by the search indexes above
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+# Monthly partitioning for the audit tables
+PARTITIONED_LOG_TABLES = ("activity_log", "ai_usage_log")
+PARTITION_MONTHS_AHEAD = 2  # Future months created ahead of time
+PARTITION_CHECK_INTERVAL = 6 * 60 * 60  # Seconds between partition checks in a running process
+
+# Rows outside every monthly range land here instead of failing the insert
+for _table in (ActivityLog.__table__, AIUsageLog.__table__):
+    event.listen(
+        _table,
+        "after_create",
+        DDL(f"CREATE TABLE IF NOT EXISTS {_table.name}_default PARTITION OF {_table.name} DEFAULT")
+    )
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.month - 1 + count
+    return date(month.year + index // 12, index % 12 + 1, 1)
+
+
+# Rollup tables fed by an AFTER INSERT trigger on the partitioned parent
+PARTITION_ROLLUPS = {"ai_usage_log": "ai_usage_daily"}
+
+
+def _rollup_totals(conn, rollup: str):
+    return tuple(conn.execute(text(
+        f"SELECT count(*), coalesce(sum(requests), 0), coalesce(sum(total_tokens), 0), "
+        f"coalesce(sum(total_cost_micros), 0) FROM {rollup}"
+    )).one())
+
+
+def _create_partition(conn, table: str, partition: str, start: date, end: date):
+    """
+    Create one monthly partition. Rows for that month that already landed in the
+    default partition (the month wasn't created in time) are moved into it, since
+    Postgres refuses the new partition while the default holds matching rows.
+
+    The month is built as a standalone table and attached afterwards, so moved rows
+    never pass through the parent's insert triggers (and aren't rolled up twice).
+    """
+    # Generated columns are recomputed on insert and can't be written explicitly
+    columns = ", ".join(conn.execute(text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = :table AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+    """), {"table": table}).scalars())
+
+    rollup = PARTITION_ROLLUPS.get(table)
+    totals_before = _rollup_totals(conn, rollup) if rollup else None
+
+    # Indexes and the primary key are added by ATTACH to match the parent
+    conn.execute(text(
+        f"CREATE TABLE {partition} "
+        f"(LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS)"
+    ))
+    moved = conn.execute(text(
+        f"WITH moved AS ("
+        f"DELETE FROM {table}_default WHERE created_at >= :start AND created_at < :end "
+        f"RETURNING {columns}) "
+        f"INSERT INTO {partition} ({columns}) SELECT {columns} FROM moved"
+    ), {"start": start, "end": end}).rowcount
+    conn.execute(text(
+        f"ALTER TABLE {table} ATTACH PARTITION {partition} "
+        f"FOR VALUES FROM ('{start}') TO ('{end}')"
+    ))
+
+    if rollup and _rollup_totals(conn, rollup) != totals_before:
+        raise RuntimeError(f"{rollup} totals changed while moving rows into {partition}")
+    if moved:
+        print(f"✓ Moved {moved} rows from {table}_default into {partition}")
+
+
+def ensure_log_partitions(bind, months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """
+    Create monthly partitions for the audit tables from the current month onwards
+
+    Safe to run from every worker, and run periodically (see PARTITION_CHECK_INTERVAL)
+    so long-running processes keep creating months ahead. Old months can be retired
+    with ALTER TABLE ... DETACH PARTITION without touching the live partition.
+    """
+    this_month = date.today().replace(day=1)
+    for table in PARTITIONED_LOG_TABLES:
+        for offset in range(months_ahead + 1):
+            start = _add_months(this_month, offset)
+            end = _add_months(start, 1)
+            partition = f"{table}_y{start.year}m{start.month:02d}"
+            try:
+                with bind.begin() as conn:
+                    exists = conn.execute(
+                        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": partition}
+                    ).scalar_one()
+                    if not exists:
+                        _create_partition(conn, table, partition, start, end)
+            except Exception as e:
+                print(f"✗ Could not create partition {partition}: {e}")
@@ -10,10 +10,16 @@ Sources:
 Last updated: 2025-01-22
 """
 
-from typing import Dict, Tuple
+import re
+import sys
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+# Costs are stored as integer micro-USD (1 USD = 1,000,000 micros)
+MICROS_PER_USD = 1_000_000
 
 # Format: "provider/model-name": {"input": price_per_1m_tokens, "output": price_per_1m_tokens}
-MODEL_PRICING: Dict[str, Dict[str, float]] = {
+MODEL_PRICING: Mapping[str, Dict[str, float]] = MappingProxyType({
     # Anthropic Claude models
     "anthropic/claude-3-5-sonnet": {"input": 3.0, "output": 15.0},
     "anthropic/claude-3-5-sonnet-20241022": {"input": 3.0, "output": 15.0},
@@ -63,11 +69,55 @@ MODEL_PRICING: Dict[str, Dict[str, float]] = {
     # Qwen models
     "qwen/qwen-2-72b-instruct": {"input": 0.35, "output": 0.35},
     "qwen/qwen-2.5-72b-instruct": {"input": 0.35, "output": 0.35},
-}
+})
 
 # Default pricing for unknown models (use conservative estimate)
 DEFAULT_PRICING = {"input": 1.0, "output": 3.0}
 
+_DATE_SUFFIX = re.compile(r"-\d{8}$")  # e.g. "-20241022" on dated Anthropic releases
+
+
+def _model_aliases(model: str) -> Tuple[str, ...]:
+    """Lookup keys for a model id: as given, without provider, and without date suffix."""
+    bare = model.split("/", 1)[-1]
+    return (model, bare, _DATE_SUFFIX.sub("", model), _DATE_SUFFIX.sub("", bare))
+
+
+def _build_alias_index(pricing: Mapping[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """Index a pricing table under every alias of its keys (exact ids take precedence)."""
+    index: Dict[str, Dict[str, float]] = {}
+    for key, value in pricing.items():
+        for alias in _model_aliases(key):
+            index.setdefault(sys.intern(alias), value)
+    index.update((sys.intern(key), value) for key, value in pricing.items())
+    return index
+
+
+def _lookup_pricing(index: Mapping[str, Any], model: str) -> Optional[Any]:
+    for alias in _model_aliases(model):
+        pricing = index.get(alias)
+        if pricing is not None:
+            return pricing
+    return None
+
+
+# Lookup tables are built once at import with interned keys and frozen read-only
+_MODEL_PRICING_INDEX: Mapping[str, Dict[str, float]] = MappingProxyType(_build_alias_index(MODEL_PRICING))
+
+# Same prices divided down to USD per single token, so calculate_cost only multiplies
+_PER_TOKEN_PRICING: Mapping[str, Tuple[float, float]] = MappingProxyType({
+    alias: (pricing["input"] / 1_000_000, pricing["output"] / 1_000_000)
+    for alias, pricing in _MODEL_PRICING_INDEX.items()
+})
+_DEFAULT_PER_TOKEN = (DEFAULT_PRICING["input"] / 1_000_000, DEFAULT_PRICING["output"] / 1_000_000)
+
+# USD per 1M tokens is numerically micro-USD per token, so storage costs need no division
+_MICROS_PER_TOKEN_PRICING: Mapping[str, Tuple[float, float]] = MappingProxyType({
+    alias: (pricing["input"], pricing["output"])
+    for alias, pricing in _MODEL_PRICING_INDEX.items()
+})
+_DEFAULT_MICROS_PER_TOKEN = (DEFAULT_PRICING["input"], DEFAULT_PRICING["output"])
+
 
 def get_model_pricing(model: str) -> Tuple[float, float]:
     """
@@ -79,10 +129,20 @@ def get_model_pricing(model: str) -> Tuple[float, float]:
     Returns:
         Tuple of (input_price_per_1m, output_price_per_1m)
     """
-    pricing = MODEL_PRICING.get(model, DEFAULT_PRICING)
+    pricing = _lookup_pricing(_MODEL_PRICING_INDEX, model) or DEFAULT_PRICING
     return pricing["input"], pricing["output"]
 
 
+def usd_to_micros(usd: float) -> int:
+    """Convert a USD amount to integer micro-USD for storage."""
+    return round(usd * MICROS_PER_USD)
+
+
+def micros_to_usd(micros: int) -> float:
+    """Convert stored micro-USD back to USD for presentation."""
+    return int(micros or 0) / MICROS_PER_USD
+
+
 def calculate_cost(model: str, input_tokens: int, output_tokens: int) -> Tuple[float, float, float]:
     """
     Calculate cost for a model invocation.
@@ -95,14 +155,31 @@ def calculate_cost(model: str, input_tokens: int, output_tokens: int) -> Tuple[f
     Returns:
         Tuple of (input_cost, output_cost, total_cost) in USD
     """
-    input_price, output_price = get_model_pricing(model)
+    input_price, output_price = _lookup_pricing(_PER_TOKEN_PRICING, model) or _DEFAULT_PER_TOKEN
 
-    # Convert from price per 1M tokens to actual cost
-    input_cost = (input_tokens / 1_000_000) * input_price
-    output_cost = (output_tokens / 1_000_000) * output_price
-    total_cost = input_cost + output_cost
+    # Unrounded - storage converts to integer micro-USD
+    input_cost = input_tokens * input_price
+    output_cost = output_tokens * output_price
+    return input_cost, output_cost, input_cost + output_cost
 
-    return round(input_cost, 6), round(output_cost, 6), round(total_cost, 6)
+
+def calculate_cost_micros(model: str, input_tokens: int, output_tokens: int) -> Tuple[int, int, int]:
+    """
+    Calculate cost for a model invocation in integer micro-USD, ready for storage.
+
+    Args:
+        model: Model identifier
+        input_tokens: Number of input tokens
+        output_tokens: Number of output tokens
+
+    Returns:
+        Tuple of (input_cost, output_cost, total_cost) in micro-USD
+    """
+    input_price, output_price = _lookup_pricing(_MICROS_PER_TOKEN_PRICING, model) or _DEFAULT_MICROS_PER_TOKEN
+
+    input_cost = round(input_tokens * input_price)
+    output_cost = round(output_tokens * output_price)
+    return input_cost, output_cost, input_cost + output_cost
 
 
 def estimate_cost(model: str, total_tokens: int, output_ratio: float = 0.3) -> float:
@@ -137,6 +214,9 @@ IMAGE_MODEL_PRICING: Dict[str, Dict[str, float]] = {
 
 DEFAULT_IMAGE_PRICE = 0.04
 
+_IMAGE_PRICING_INDEX: Mapping[str, Dict[str, float]] = MappingProxyType(_build_alias_index(IMAGE_MODEL_PRICING))
+_image_partial_matches: Dict[str, Optional[Dict[str, float]]] = {}  # Memoized fallback scans
+
 
 def calculate_image_cost(model: str, size: str = "1024x1024", quality: str = "standard") -> float:
     """
@@ -150,16 +230,18 @@ def calculate_image_cost(model: str, size: str = "1024x1024", quality: str = "st
     Returns:
         Total cost in USD
     """
-    # Normalize model name (remove provider if needed, but our dict keys have provider)
-    pricing = IMAGE_MODEL_PRICING.get(model)
-    
-    if not pricing:
-        # Try to find by partial match
-        for key, val in IMAGE_MODEL_PRICING.items():
-            if model in key or key in model:
-                pricing = val
-                break
-    
+    # Exact id, provider-less id or undated id
+    pricing = _lookup_pricing(_IMAGE_PRICING_INDEX, model)
+
+    if pricing is None:
+        # Try to find by partial match (scanned once per unknown model)
+        if model not in _image_partial_matches:
+            _image_partial_matches[model] = next(
+                (val for key, val in IMAGE_MODEL_PRICING.items() if model in key or key in model),
+                None
+            )
+        pricing = _image_partial_matches[model]
+
     if not pricing:
         return DEFAULT_IMAGE_PRICE
 
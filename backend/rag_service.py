@@ -1,15 +1,22 @@
 import os
-from typing import List
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Tuple
+import fitz  # PyMuPDF
+import numpy as np
 from minio import Minio
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores.pgvector import PGVector
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document as LangchainDocument
 from models import Document
-from database import DATABASE_URL
+from database import DATABASE_URL, SessionLocal, engine
 from image_service import image_service
+from minio_service import UPLOAD_PART_SIZE, UPLOAD_PARALLEL_PARTS
+from text_splitting import split_documents
 
 # MinIO Configuration
 MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "minio:9000")
@@ -17,6 +24,17 @@ MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
 MINIO_BUCKET = "xtyl-documents"
 
+# Stored object content type by file suffix
+CONTENT_TYPES = {
+    ".pdf": "application/pdf",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".bmp": "image/bmp",
+    ".webp": "image/webp",
+}
+
 minio_client = Minio(
     MINIO_ENDPOINT.replace("http://", ""),
     access_key=MINIO_ACCESS_KEY,
@@ -24,12 +42,18 @@ minio_client = Minio(
     secure=False
 )
 
+_bucket_ready = False
+
 # Ensure bucket exists (lazy - will be created on first use)
 def ensure_minio_bucket():
     """Ensure MinIO bucket exists. Call this before using MinIO."""
+    global _bucket_ready
+    if _bucket_ready:
+        return
     try:
         if not minio_client.bucket_exists(MINIO_BUCKET):
             minio_client.make_bucket(MINIO_BUCKET)
+        _bucket_ready = True
     except Exception as e:
         print(f"Warning: Could not ensure MinIO bucket: {e}")
         # Don't crash on import - let it fail on actual use
@@ -48,6 +72,255 @@ embeddings = OpenAIEmbeddings(
 
 # Connection string for PGVector
 CONNECTION_STRING = DATABASE_URL.replace("postgresql://", "postgresql+psycopg2://")
+COLLECTION_NAME = "xtyl_knowledge_base"
+EMBEDDING_DIMENSIONS = 1536  # HNSW indexes need a fixed-dimension column
+
+# The HNSW index is built over a half-precision cast of the embeddings: half the
+# memory per graph node, so twice as much of the index stays cached. Rows keep
+# full precision. Queries must use the same cast expression to hit the index.
+# Stored vectors are unit length, so inner product (<#>) ranks like cosine
+# distance without the per-comparison norm computations.
+HALFVEC_EMBEDDING = f"e.embedding::halfvec({EMBEDDING_DIMENSIONS})"
+
+# HNSW graph parameters (see migrations/024_knowledge_base_inner_product_index.sql)
+HNSW_M = 24
+HNSW_EF_CONSTRUCTION = 128
+HNSW_EF_SEARCH = os.getenv("HNSW_EF_SEARCH")  # Fixed override; otherwise sized from the collection
+COLLECTION_COUNT_TTL = 60  # Seconds
+
+# Ingestion (upload, OCR/PDF parse, embed, insert) runs on its own worker pool so
+# several documents are processed concurrently without tying up request workers
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+_ingest_pool = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="rag-ingest")
+
+# Splits from documents being ingested at the same time are embedded together:
+# the batcher collects texts for up to EMBED_BATCH_INTERVAL (or MAX_BATCH_TEXTS)
+# and sends them in one embed_documents call instead of one request per document
+MAX_BATCH_TEXTS = 512
+EMBED_BATCH_INTERVAL = 0.25  # Seconds to wait for more documents before embedding
+
+_embed_queue: "queue.Queue[Tuple[List[str], List[dict], Future]]" = queue.Queue()
+_embed_thread = None
+_embed_thread_lock = threading.Lock()
+
+_vector_store = None
+_vector_store_lock = threading.Lock()  # Ingest workers may ask for the store concurrently
+_collection_count = None
+_collection_count_timestamp = 0.0
+
+def configure_hnsw_params(n: int) -> Dict[str, int]:
+    """
+    HNSW settings for a collection of n vectors. Small collections don't need a
+    dense graph or a wide search beam; large ones lose recall without them.
+    m/ef_construction apply when the index is (re)built, ef_search per query.
+    """
+    if n < 100_000:
+        return {"m": 16, "ef_construction": 64, "ef_search": 40}
+    if n < 1_000_000:
+        return {"m": 24, "ef_construction": 128, "ef_search": 100}
+    if n < 10_000_000:
+        return {"m": 32, "ef_construction": 200, "ef_search": 200}
+    return {"m": 48, "ef_construction": 256, "ef_search": 400}
+
+def get_collection_count(conn) -> int:
+    """Number of vectors in the knowledge base collection, cached for COLLECTION_COUNT_TTL."""
+    global _collection_count, _collection_count_timestamp
+    if _collection_count is None or time.monotonic() - _collection_count_timestamp > COLLECTION_COUNT_TTL:
+        _collection_count = conn.execute(text("""
+            SELECT count(*) FROM langchain_pg_embedding e
+            JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+            WHERE c.name = :collection
+        """), {"collection": COLLECTION_NAME}).scalar_one()
+        _collection_count_timestamp = time.monotonic()
+    return _collection_count
+
+# Plain uuid columns copied out of cmetadata on insert, so project/document filters are
+# btree-indexable scalar predicates the planner can combine with the HNSW scan.
+# Existing databases get these from migrations 022-025; the statements below only
+# bootstrap a fresh (empty) embeddings table.
+_SCOPE_COLUMNS_DDL = """
+ALTER TABLE langchain_pg_embedding
+    ADD COLUMN IF NOT EXISTS document_id uuid,
+    ADD COLUMN IF NOT EXISTS project_id uuid
+"""
+
+_SCOPE_TRIGGER_DDL = """
+CREATE OR REPLACE FUNCTION langchain_pg_embedding_scope() RETURNS trigger AS $$
+BEGIN
+    NEW.document_id := (NEW.cmetadata->>'document_id')::uuid;
+    NEW.project_id := (NEW.cmetadata->>'project_id')::uuid;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER langchain_pg_embedding_scope_trg BEFORE INSERT ON langchain_pg_embedding
+    FOR EACH ROW EXECUTE FUNCTION langchain_pg_embedding_scope();
+"""
+
+_VECTOR_INDEXES = {
+    "idx_lc_embedding_project": "CREATE INDEX IF NOT EXISTS idx_lc_embedding_project ON langchain_pg_embedding(project_id)",
+    "idx_lc_embedding_document": "CREATE INDEX IF NOT EXISTS idx_lc_embedding_document ON langchain_pg_embedding(document_id)",
+    "idx_lc_embedding_hnsw_half_ip": (
+        "CREATE INDEX IF NOT EXISTS idx_lc_embedding_hnsw_half_ip ON langchain_pg_embedding "
+        f"USING hnsw ((embedding::halfvec({EMBEDDING_DIMENSIONS})) halfvec_ip_ops) "
+        f"WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})"
+    ),
+}
+
+# Keep scanning the HNSW graph until enough rows pass the project filter (pgvector >= 0.8);
+# set to an empty string to disable on older pgvector versions
+HNSW_ITERATIVE_SCAN = os.getenv("HNSW_ITERATIVE_SCAN", "relaxed_order")
+
+def ensure_vector_index():
+    """
+    Create the scope columns, trigger and indexes on a fresh embeddings table.
+
+    Reads the catalogs first and issues no DDL when everything exists, so worker
+    startup never takes locks on the live table. On a table that already holds
+    rows, missing objects are reported rather than built here (ALTER TABLE and a
+    non-concurrent HNSW build would block ingestion and search): apply the
+    knowledge base migrations instead.
+    """
+    with engine.begin() as conn:
+        columns = set(conn.execute(text("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'langchain_pg_embedding' AND column_name IN ('document_id', 'project_id')
+        """)).scalars())
+        has_trigger = conn.execute(text("""
+            SELECT EXISTS (
+                SELECT 1 FROM pg_trigger
+                WHERE tgname = 'langchain_pg_embedding_scope_trg'
+                  AND tgrelid = 'langchain_pg_embedding'::regclass
+            )
+        """)).scalar_one()
+        indexes = set(conn.execute(text("""
+            SELECT indexname FROM pg_indexes
+            WHERE tablename = 'langchain_pg_embedding' AND indexname = ANY(:names)
+        """), {"names": list(_VECTOR_INDEXES)}).scalars())
+
+        missing_indexes = [name for name in _VECTOR_INDEXES if name not in indexes]
+        if len(columns) == 2 and has_trigger and not missing_indexes:
+            return
+
+        if conn.execute(text("SELECT EXISTS (SELECT 1 FROM langchain_pg_embedding)")).scalar_one():
+            print("✗ Knowledge base schema incomplete on a populated table; apply migrations 022-025")
+            return
+
+        # Fresh table: cheap to build, but don't queue behind another process doing the same
+        conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        conn.execute(text("SET LOCAL maintenance_work_mem = '512MB'"))
+        if len(columns) < 2:
+            conn.execute(text(_SCOPE_COLUMNS_DDL))
+        if not has_trigger:
+            conn.execute(text(_SCOPE_TRIGGER_DDL))
+        for name in missing_indexes:
+            conn.execute(text(_VECTOR_INDEXES[name]))
+        print("✓ Knowledge base columns and indexes created")
+
+def normalize_embeddings(vectors: List[List[float]]) -> List[List[float]]:
+    """L2-normalize a batch of embeddings in one vectorized pass (zero rows are left as-is)."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).tolist()
+
+def get_vector_store() -> PGVector:
+    """Shared PGVector store, so its engine and connection pool are created once per process."""
+    global _vector_store
+    if _vector_store is not None:
+        return _vector_store
+    with _vector_store_lock:
+        if _vector_store is None:
+            store = PGVector(
+                collection_name=COLLECTION_NAME,
+                connection_string=CONNECTION_STRING,
+                embedding_function=embeddings,
+                embedding_length=EMBEDDING_DIMENSIONS,
+            )
+            try:
+                ensure_vector_index()
+            except Exception as e:
+                print(f"Warning: Could not ensure HNSW index: {e}")
+            _vector_store = store
+    return _vector_store
+
+# NUL and other C0 control characters (keeping tab/newline/CR) plus DEL; Postgres
+# text columns reject NUL, and PDF extraction regularly produces these
+_CTRL_TRANSLATE = dict.fromkeys(
+    [*range(0x00, 0x09), 0x0b, 0x0c, *range(0x0e, 0x20), 0x7f], None
+)
+
+def sanitize_text(text: str) -> str:
+    """Strip control characters in a single str.translate pass."""
+    return text.translate(_CTRL_TRANSLATE) if text else text
+
+def _drain_embed_batch() -> List[Tuple[List[str], List[dict], Future]]:
+    """Collect pending documents until MAX_BATCH_TEXTS texts or EMBED_BATCH_INTERVAL has passed."""
+    batch = [_embed_queue.get()]
+    total = len(batch[0][0])
+
+    deadline = time.monotonic() + EMBED_BATCH_INTERVAL
+    while total < MAX_BATCH_TEXTS:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            item = _embed_queue.get(timeout=remaining)
+        except queue.Empty:
+            break
+        batch.append(item)
+        total += len(item[0])
+    return batch
+
+def _embed_and_store(texts: List[str], metadatas: List[dict]):
+    vectors = normalize_embeddings(embeddings.embed_documents(texts))
+    get_vector_store().add_embeddings(texts=texts, embeddings=vectors, metadatas=metadatas)
+
+def _embed_batch(batch: List[Tuple[List[str], List[dict], Future]]):
+    """
+    Embed every document in the batch with one call and insert their vectors.
+    If the combined call fails, each document is retried on its own so only the
+    one that caused it (token limit, bad metadata) is failed.
+    """
+    try:
+        _embed_and_store(
+            [t for item_texts, _, _ in batch for t in item_texts],
+            [m for _, item_metadatas, _ in batch for m in item_metadatas]
+        )
+    except Exception as e:
+        if len(batch) == 1:
+            batch[0][2].set_exception(e)
+            return
+        for texts, metadatas, future in batch:
+            try:
+                _embed_and_store(texts, metadatas)
+            except Exception as item_error:
+                future.set_exception(item_error)
+            else:
+                future.set_result(None)
+        return
+    for _, _, future in batch:
+        future.set_result(None)
+
+def _embed_loop():
+    while True:
+        _embed_batch(_drain_embed_batch())
+
+def _ensure_embed_thread():
+    global _embed_thread
+    if _embed_thread is not None:
+        return
+    with _embed_thread_lock:
+        if _embed_thread is None:
+            _embed_thread = threading.Thread(target=_embed_loop, name="rag-embed-batcher", daemon=True)
+            _embed_thread.start()
+
+def enqueue_embeddings(texts: List[str], metadatas: List[dict]) -> Future:
+    """Queue a document's splits for the next embedding batch; the future resolves once stored."""
+    future: Future = Future()
+    _embed_queue.put((texts, metadatas, future))
+    _ensure_embed_thread()
+    return future
 
 def process_document(db: Session, document_id: str, file_path: str, original_filename: str):
     """
@@ -61,15 +334,24 @@ def process_document(db: Session, document_id: str, file_path: str, original_fil
     # Ensure MinIO bucket exists before using it
     ensure_minio_bucket()
 
+    is_image = image_service.is_image(original_filename)
+
     # 1. Upload to MinIO
     try:
-        minio_client.fput_object(MINIO_BUCKET, f"{document_id}/{original_filename}", file_path)
+        content_type = CONTENT_TYPES.get(os.path.splitext(original_filename)[1].lower(), "application/octet-stream")
+        # Large files go up as a multipart upload with several parts in flight
+        minio_client.fput_object(
+            MINIO_BUCKET, f"{document_id}/{original_filename}", file_path,
+            content_type=content_type,
+            part_size=UPLOAD_PART_SIZE,
+            num_parallel_uploads=UPLOAD_PARALLEL_PARTS
+        )
 
         # If it's an image, also upload a thumbnail
-        if image_service.is_image(original_filename):
+        if is_image:
             thumbnail_path = f"{file_path}_thumb.jpg"
             if image_service.generate_thumbnail(file_path, thumbnail_path):
-                minio_client.fput_object(MINIO_BUCKET, f"{document_id}/thumbnail.jpg", thumbnail_path)
+                minio_client.fput_object(MINIO_BUCKET, f"{document_id}/thumbnail.jpg", thumbnail_path, content_type="image/jpeg")
                 os.remove(thumbnail_path)
     except Exception as e:
         print(f"Error uploading to MinIO: {e}")
@@ -79,7 +361,7 @@ def process_document(db: Session, document_id: str, file_path: str, original_fil
     docs = []
     extracted_text = ""
 
-    if image_service.is_image(original_filename):
+    if is_image:
         # Process image with OCR
         print(f"Processing image: {original_filename}")
 
@@ -123,65 +405,102 @@ def process_document(db: Session, document_id: str, file_path: str, original_fil
                 }
             )]
     else:
-        # Process PDF
-        loader = PyPDFLoader(file_path)
-        docs = loader.load()
+        # Process PDF (MuPDF's native text extraction, one document per page)
+        with fitz.open(file_path) as pdf:
+            docs = [
+                LangchainDocument(
+                    page_content=page.get_text("text"),
+                    metadata={"source": original_filename, "page": i}
+                )
+                for i, page in enumerate(pdf)
+            ]
 
     # 3. Split text
     if docs:
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        splits = text_splitter.split_documents(docs)
+        splits = split_documents(docs)  # Long PDFs are split page-parallel across processes
 
-        # Add document_id metadata to all splits
+        # Add document/project metadata to all splits (project scopes knowledge base search)
+        project_id = db.query(Document.project_id).filter(Document.id == document_id).scalar()
         for split in splits:
+            split.page_content = sanitize_text(split.page_content)
             split.metadata["document_id"] = document_id
+            split.metadata["project_id"] = str(project_id) if project_id else None
             if "source" not in split.metadata:
                 split.metadata["source"] = original_filename
 
-        # 4 & 5. Embed and Store
+        # 4 & 5. Embed and store together with other documents being ingested,
+        # waiting so the status below only flips once the vectors are in
         if splits:
-            PGVector.from_documents(
-                embedding=embeddings,
-                documents=splits,
-                collection_name="xtyl_knowledge_base",
-                connection_string=CONNECTION_STRING,
-            )
+            texts = [split.page_content for split in splits]
+            metadatas = [split.metadata for split in splits]
+            enqueue_embeddings(texts, metadatas).result()
 
     # Update document status in DB
     db_doc = db.query(Document).filter(Document.id == document_id).first()
     if db_doc:
         db_doc.status = "processed"
-        if extracted_text and image_service.is_image(original_filename):
-            db_doc.content = f"Image processed with OCR:\n\n{extracted_text[:500]}..."
+        if extracted_text and is_image:
+            db_doc.content = f"Image processed with OCR:\n\n{sanitize_text(extracted_text[:500])}..."
         db.commit()
 
+def _process_document_job(document_id: str, file_path: str, original_filename: str):
+    """Run process_document on an ingest worker with its own session."""
+    db = SessionLocal()
+    try:
+        process_document(db, document_id, file_path, original_filename)
+    except Exception as e:
+        db.rollback()
+        print(f"✗ Failed to process document {document_id}: {e}")
+        db_doc = db.query(Document).filter(Document.id == document_id).first()
+        if db_doc:
+            db_doc.status = "error"
+            db.commit()
+    finally:
+        db.close()
+
+def submit_document(document_id: str, file_path: str, original_filename: str) -> Future:
+    """Queue an uploaded file for ingestion on the worker pool."""
+    return _ingest_pool.submit(_process_document_job, document_id, file_path, original_filename)
+
 def query_knowledge_base(query: str, project_id: str = None, document_ids: List[str] = None, k: int = 4):
-    store = PGVector(
-        collection_name="xtyl_knowledge_base",
-        connection_string=CONNECTION_STRING,
-        embedding_function=embeddings,
-    )
-    
-    filter = {}
+    """
+    Cosine similarity search over the knowledge base, served by the HNSW index.
+
+    Runs the nearest-neighbour query directly so hnsw.ef_search can be set for
+    just this transaction (PGVector.similarity_search opens its own session).
+    """
+    get_vector_store()  # Make sure the collection and index exist
+    query_embedding = embeddings.embed_query(query)
+
+    sql = """
+        SELECT e.document, e.cmetadata
+        FROM langchain_pg_embedding e
+        JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+        WHERE c.name = :collection
+    """
+    params = {
+        "collection": COLLECTION_NAME,
+        "embedding": str(query_embedding),
+        "k": k,
+    }
     if project_id:
-        filter["project_id"] = project_id # This assumes metadata has project_id, need to ensure it does
-    
-    # PGVector filter syntax depends on the underlying implementation. 
-    # LangChain's PGVector supports a dict filter which maps to metadata columns.
-    # However, filtering by a list of IDs ("IN" clause) might be tricky with simple dict match.
-    # We will use a post-filtering approach or rely on metadata filter if supported.
-    # For now, let's assume we pass a filter dict.
-    
-    # If document_ids is provided, we might need to construct a more complex filter
-    # or just filter the results if the dataset is small. 
-    # Ideally, we pass a filter to the vector store.
-    
-    kwargs = {}
+        sql += " AND e.project_id = CAST(:project_id AS uuid)"
+        params["project_id"] = project_id
     if document_ids:
-        # LangChain PGVector filter format: {"document_id": {"in": [...]}} or similar depending on version
-        # For simplicity/compatibility, let's try standard metadata filtering
-        # Note: This might need adjustment based on exact pgvector/langchain version
-        kwargs["filter"] = {"document_id": {"in": document_ids}}
+        sql += " AND e.document_id = ANY(CAST(:document_ids AS uuid[]))"
+        params["document_ids"] = list(document_ids)
+    sql += f" ORDER BY {HALFVEC_EMBEDDING} <#> CAST(:embedding AS halfvec({EMBEDDING_DIMENSIONS})) LIMIT :k"
+
+    with engine.begin() as conn:
+        if HNSW_EF_SEARCH:
+            ef_search = int(HNSW_EF_SEARCH)
+        else:
+            ef_search = configure_hnsw_params(get_collection_count(conn))["ef_search"]
+        # The beam must be at least as wide as the number of results requested
+        ef_search = max(ef_search, k)
+        conn.execute(text("SELECT set_config('hnsw.ef_search', :ef, true)"), {"ef": str(ef_search)})
+        if HNSW_ITERATIVE_SCAN and (project_id or document_ids):
+            conn.execute(text("SELECT set_config('hnsw.iterative_scan', :mode, true)"), {"mode": HNSW_ITERATIVE_SCAN})
+        rows = conn.execute(text(sql), params).all()
 
-    docs = store.similarity_search(query, k=k, **kwargs)
-    return docs
+    return [LangchainDocument(page_content=row.document, metadata=row.cmetadata or {}) for row in rows]
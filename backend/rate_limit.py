@@ -0,0 +1,52 @@
+"""
+Rate Limiting
+
+In-process fixed-window counters for endpoints whose work is expensive to
+trigger (password hashing, outgoing email), so abusive clients are turned
+away before that work starts. Limits are per worker process.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Tuple
+
+from fastapi import HTTPException, status
+
+MAX_TRACKED_KEYS = 100_000  # Oldest windows are evicted beyond this
+
+
+class RateLimiter:
+    """Allow `limit` hits per key in each `window` seconds."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._hits: "OrderedDict[Hashable, Tuple[int, float]]" = OrderedDict()  # key -> (count, window_end)
+        self._lock = threading.Lock()
+
+    def hit(self, key: Hashable) -> float:
+        """Count a hit for key. Returns 0 if allowed, else seconds until the window resets."""
+        now = time.monotonic()
+        with self._lock:
+            count, window_end = self._hits.get(key, (0, 0.0))
+            if window_end <= now:
+                count, window_end = 0, now + self.window
+            if count >= self.limit:
+                return window_end - now
+            self._hits[key] = (count + 1, window_end)
+            self._hits.move_to_end(key)
+            while len(self._hits) > MAX_TRACKED_KEYS:
+                self._hits.popitem(last=False)
+        return 0
+
+    def check(self, key: Hashable):
+        """hit(), raising 429 with Retry-After when the key is over its limit."""
+        retry_after = self.hit(key)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many attempts, please try again later",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
@@ -1,4 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import String, cast, func, select
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from pydantic import BaseModel
@@ -25,7 +27,7 @@ class ActivityResponse(BaseModel):
     class Config:
         from_attributes = True
 
-@router.get("/{entity_type}/{entity_id}", response_model=dict)
+@router.get("/{entity_type}/{entity_id}")
 async def get_activity_history(
     entity_type: str,
     entity_id: str,
@@ -38,7 +40,9 @@ async def get_activity_history(
 
     activities = get_entity_activity(db, entity_type, entity_id)
 
-    return {
+    # Returned as a response directly: no response_model validation pass, and
+    # orjson writes created_at as an ISO 8601 string itself
+    return ORJSONResponse({
         "entity_type": entity_type,
         "entity_id": entity_id,
         "activities": [
@@ -48,14 +52,14 @@ async def get_activity_history(
                 "actor_type": activity.actor_type,
                 "user_id": activity.user_id,
                 "changes": activity.changes,
-                "created_at": str(activity.created_at)
+                "created_at": activity.created_at
             }
             for activity in activities
         ],
         "count": len(activities)
-    }
+    })
 
-@router.get("/project/{project_id}/recent", response_model=dict)
+@router.get("/project/{project_id}/recent")
 async def get_recent_project_activity(
     project_id: str,
     limit: int = 50,
@@ -65,13 +69,13 @@ async def get_recent_project_activity(
     """Get recent activity across all documents and folders in a project"""
     from models import Document, Folder
 
-    # Get all document IDs in the project
-    documents = db.query(Document).filter(Document.project_id == project_id).all()
-    doc_ids = [doc.id for doc in documents]
+    # Get all document IDs (and titles, for enrichment) in the project
+    doc_map = dict(db.query(Document.id, Document.title).filter(Document.project_id == project_id).all())
+    doc_ids = list(doc_map)
 
-    # Get all folder IDs in the project
-    folders = db.query(Folder).filter(Folder.project_id == project_id).all()
-    folder_ids = [folder.id for folder in folders]
+    # Get all folder IDs (and names) in the project
+    folder_map = dict(db.query(Folder.id, Folder.name).filter(Folder.project_id == project_id).all())
+    folder_ids = list(folder_map)
 
     # Get activities for all entities
     activities = db.query(ActivityLog).filter(
@@ -90,28 +94,26 @@ async def get_recent_project_activity(
             "actor_type": activity.actor_type,
             "user_id": activity.user_id,
             "changes": activity.changes,
-            "created_at": str(activity.created_at)
+            "created_at": activity.created_at
         }
 
         # Add entity name
         if activity.entity_type == "document":
-            doc = next((d for d in documents if d.id == activity.entity_id), None)
-            if doc:
-                activity_data["entity_name"] = doc.title
+            if activity.entity_id in doc_map:
+                activity_data["entity_name"] = doc_map[activity.entity_id]
         elif activity.entity_type == "folder":
-            folder = next((f for f in folders if f.id == activity.entity_id), None)
-            if folder:
-                activity_data["entity_name"] = folder.name
+            if activity.entity_id in folder_map:
+                activity_data["entity_name"] = folder_map[activity.entity_id]
 
         enriched_activities.append(activity_data)
 
-    return {
+    return ORJSONResponse({
         "project_id": project_id,
         "activities": enriched_activities,
         "count": len(enriched_activities)
-    }
+    })
 
-@router.get("/user/{user_id}/recent", response_model=dict)
+@router.get("/user/{user_id}/recent")
 async def get_user_recent_activity(
     user_id: str,
     limit: int = 50,
@@ -128,7 +130,7 @@ async def get_user_recent_activity(
         ActivityLog.user_id == user_id
     ).order_by(ActivityLog.created_at.desc()).limit(limit).all()
 
-    return {
+    return ORJSONResponse({
         "user_id": user_id,
         "activities": [
             {
@@ -138,14 +140,14 @@ async def get_user_recent_activity(
                 "action": activity.action,
                 "actor_type": activity.actor_type,
                 "changes": activity.changes,
-                "created_at": str(activity.created_at)
+                "created_at": activity.created_at
             }
             for activity in activities
         ],
         "count": len(activities)
-    }
+    })
 
-@router.get("/stats/ai-vs-human/{project_id}", response_model=dict)
+@router.get("/stats/ai-vs-human/{project_id}")
 async def get_ai_human_stats(
     project_id: str,
     current_user: User = Depends(get_current_user),
@@ -154,31 +156,35 @@ async def get_ai_human_stats(
     """Get statistics on AI vs Human changes in a project"""
     from models import Document, Folder
 
-    # Get all entity IDs in the project
-    documents = db.query(Document).filter(Document.project_id == project_id).all()
-    doc_ids = [doc.id for doc in documents]
+    # Entities in the project, as subqueries (activity_log stores entity ids as text)
+    doc_ids = select(cast(Document.id, String)).where(Document.project_id == project_id)
+    folder_ids = select(cast(Folder.id, String)).where(Folder.project_id == project_id)
 
-    folders = db.query(Folder).filter(Folder.project_id == project_id).all()
-    folder_ids = [folder.id for folder in folders]
-
-    # Get all activities
-    activities = db.query(ActivityLog).filter(
+    # Count per (actor_type, action) in Postgres; only the grouped rows come back
+    grouped = db.query(
+        ActivityLog.actor_type, ActivityLog.action, func.count()
+    ).filter(
         ((ActivityLog.entity_type == "document") & (ActivityLog.entity_id.in_(doc_ids))) |
         ((ActivityLog.entity_type == "folder") & (ActivityLog.entity_id.in_(folder_ids)))
-    ).all()
+    ).group_by(ActivityLog.actor_type, ActivityLog.action).all()
 
     # Calculate stats
-    ai_count = sum(1 for a in activities if a.actor_type == "ai")
-    human_count = sum(1 for a in activities if a.actor_type == "human")
-
+    total_count = 0
+    ai_count = 0
+    human_count = 0
     action_counts = {}
-    for activity in activities:
-        action_counts[activity.action] = action_counts.get(activity.action, 0) + 1
-
-    return {
+    for actor_type, action, count in grouped:
+        total_count += count
+        if actor_type == "ai":
+            ai_count += count
+        elif actor_type == "human":
+            human_count += count
+        action_counts[action] = action_counts.get(action, 0) + count
+
+    return ORJSONResponse({
         "project_id": project_id,
-        "total_activities": len(activities),
+        "total_activities": total_count,
         "ai_actions": ai_count,
         "human_actions": human_count,
         "action_breakdown": action_counts
-    }
+    })
@@ -6,7 +6,7 @@ from database import get_db
 from models import User
 from schemas import AIUsageLog, AIUsageStats, AIUsageSummary
 from auth import get_current_user
-from ai_usage_service import get_usage_stats, get_usage_logs, get_daily_usage_trend
+from ai_usage_service import get_usage_stats, get_usage_summary, get_usage_logs, get_daily_usage_trend
 
 router = APIRouter(
     prefix="/ai-usage",
@@ -57,47 +57,22 @@ def get_summary(
     week_start = now - timedelta(days=now.weekday())
     month_start = datetime(now.year, now.month, 1)
 
-    # Get stats for each period
-    today_stats = get_usage_stats(
+    # All four periods come from one query with per-period FILTER aggregates
+    summary = get_usage_summary(
         db=db,
+        periods={
+            "today": today_start,
+            "this_week": week_start,
+            "this_month": month_start,
+            "all_time": None
+        },
         user_id=current_user.id,
         workspace_id=workspace_id,
         project_id=project_id,
-        start_date=today_start,
         end_date=now
     )
 
-    week_stats = get_usage_stats(
-        db=db,
-        user_id=current_user.id,
-        workspace_id=workspace_id,
-        project_id=project_id,
-        start_date=week_start,
-        end_date=now
-    )
-
-    month_stats = get_usage_stats(
-        db=db,
-        user_id=current_user.id,
-        workspace_id=workspace_id,
-        project_id=project_id,
-        start_date=month_start,
-        end_date=now
-    )
-
-    all_time_stats = get_usage_stats(
-        db=db,
-        user_id=current_user.id,
-        workspace_id=workspace_id,
-        project_id=project_id
-    )
-
-    return AIUsageSummary(
-        today=today_stats,
-        this_week=week_stats,
-        this_month=month_stats,
-        all_time=all_time_stats
-    )
+    return AIUsageSummary(**summary)
 
 
 @router.get("/logs", response_model=List[AIUsageLog])
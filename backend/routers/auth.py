@@ -1,19 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from datetime import timedelta
-from pydantic import BaseModel, EmailStr
+import os
+from typing import Annotated
+from pydantic import BaseModel, StringConstraints
 from database import get_db
 from schemas import UserCreate, User, UserUpdate
-from crud import create_user, get_user_by_email, verify_password, update_user, update_user_password
-from auth import create_access_token, create_refresh_token, ACCESS_TOKEN_EXPIRE_MINUTES, get_current_user, create_password_reset_token, verify_password_reset_token, verify_token
+from crud import create_user, get_user_by_email, cached_get_user_by_email, authenticate_user, update_user, update_user_password
+from auth import create_access_token, create_refresh_token, ACCESS_TOKEN_TTL, get_current_user, create_password_reset_token, verify_password_reset_token, decode_refresh_token
 from email_service import send_password_reset_email
+from rate_limit import RateLimiter
 
 router = APIRouter(
     prefix="/auth",
     tags=["auth"],
 )
 
+# Checked before any password hashing or email sending. Client IP and email are
+# limited independently: keying on the pair would let one IP rotate emails freely,
+# and unknown emails still cost a full hash (see crud.authenticate_user)
+AUTH_RATE_LIMIT = int(os.getenv("AUTH_RATE_LIMIT", "5"))  # Attempts per email
+AUTH_IP_RATE_LIMIT = int(os.getenv("AUTH_IP_RATE_LIMIT", "20"))  # Attempts per client IP (may be shared via NAT)
+AUTH_RATE_WINDOW = int(os.getenv("AUTH_RATE_WINDOW", "60"))  # Seconds
+
+login_ip_limiter = RateLimiter(AUTH_IP_RATE_LIMIT, AUTH_RATE_WINDOW)
+login_email_limiter = RateLimiter(AUTH_RATE_LIMIT, AUTH_RATE_WINDOW)
+password_reset_ip_limiter = RateLimiter(AUTH_IP_RATE_LIMIT, AUTH_RATE_WINDOW)
+password_reset_email_limiter = RateLimiter(AUTH_RATE_LIMIT, AUTH_RATE_WINDOW)
+
+
+# Resolved from X-Forwarded-For behind the proxy (FORWARDED_ALLOW_IPS, see Dockerfile.prod)
+def _client_ip(request: Request) -> str:
+    return request.client.host if request.client else ""
+
 @router.post("/register", response_model=User)
 def register(user: UserCreate, db: Session = Depends(get_db)):
     db_user = get_user_by_email(db, email=user.email)
@@ -22,17 +41,18 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     return create_user(db=db, user=user)
 
 @router.post("/token")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login_for_access_token(http_request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    login_ip_limiter.check(_client_ip(http_request))
+    login_email_limiter.check(form_data.username.lower())
     user = get_user_by_email(db, email=form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not authenticate_user(db, user, form_data.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email}, expires_delta=ACCESS_TOKEN_TTL
     )
     refresh_token = create_refresh_token(data={"sub": user.email})
     return {
@@ -49,7 +69,7 @@ class RefreshTokenRequest(BaseModel):
 @router.post("/refresh")
 def refresh_access_token(request: RefreshTokenRequest, db: Session = Depends(get_db)):
     """Refresh access token using refresh token"""
-    payload = verify_token(request.refresh_token)
+    payload = decode_refresh_token(request.refresh_token)
 
     if not payload:
         raise HTTPException(
@@ -58,25 +78,10 @@ def refresh_access_token(request: RefreshTokenRequest, db: Session = Depends(get
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # Check if it's a refresh token
-    token_type = payload.get("type")
-    if token_type != "refresh":
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token type",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    email = payload.get("sub")
-    if not email:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token payload",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    email = payload["sub"]
 
-    # Verify user still exists
-    user = get_user_by_email(db, email=email)
+    # Verify user still exists (cached briefly; refresh only needs existence and email)
+    user = cached_get_user_by_email(db, email=email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -84,9 +89,8 @@ def refresh_access_token(request: RefreshTokenRequest, db: Session = Depends(get
         )
 
     # Create new access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": email}, expires_delta=ACCESS_TOKEN_TTL
     )
 
     return {
@@ -96,8 +100,13 @@ def refresh_access_token(request: RefreshTokenRequest, db: Session = Depends(get
 
 
 # Password Reset Models
+# Shape check only: an unknown address is answered like a known one anyway, so the
+# full email-validator pass buys nothing here
+EmailField = Annotated[str, StringConstraints(pattern=r"^[^@\s]+@[^@\s]+\.[^@\s]+$", max_length=254)]
+
+
 class PasswordResetRequest(BaseModel):
-    email: EmailStr
+    email: EmailField
 
 
 class PasswordResetConfirm(BaseModel):
@@ -106,15 +115,19 @@ class PasswordResetConfirm(BaseModel):
 
 
 @router.post("/password-reset/request")
-def request_password_reset(request: PasswordResetRequest, db: Session = Depends(get_db)):
+def request_password_reset(request: PasswordResetRequest, http_request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Request password reset - sends email with reset link"""
+    password_reset_ip_limiter.check(_client_ip(http_request))
+    password_reset_email_limiter.check(request.email.lower())
     user = get_user_by_email(db, email=request.email)
 
     # Always return success to prevent email enumeration
-    # But only send email if user exists
+    # But only send email if user exists, after the response so SMTP latency
+    # neither delays it nor reveals whether the account exists
     if user:
         reset_token = create_password_reset_token(user.email)
-        send_password_reset_email(
+        background_tasks.add_task(
+            send_password_reset_email,
             email=user.email,
             reset_token=reset_token,
             user_name=user.full_name
@@ -152,9 +165,21 @@ def confirm_password_reset(request: PasswordResetConfirm, db: Session = Depends(
         "success": True
     }
 
-@router.get("/me", response_model=User)
-def read_users_me(current_user: User = Depends(get_current_user)):
-    return current_user
+# No blocking work here (the user comes from get_current_user), so serve it on
+# the event loop; routes that use the sync Session stay plain def
+# response_model=None so FastAPI doesn't validate the returned User against a
+# response field again; `responses` keeps the schema in the OpenAPI docs
+@router.get("/me", response_model=None, responses={200: {"model": User}})
+async def read_users_me(current_user: User = Depends(get_current_user)) -> User:
+    # The row was loaded and checked by get_current_user; model_construct builds
+    # the DTO without running validators, and it is only dumped on the way out
+    return User.model_construct(
+        id=current_user.id,
+        email=current_user.email,
+        full_name=current_user.full_name,
+        is_active=current_user.is_active,
+        created_at=current_user.created_at
+    )
 
 @router.put("/me", response_model=User)
 def update_me(user_update: UserUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -2,8 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 import asyncio
+from dataclasses import dataclass
 from database import get_db
 from auth import get_current_user
 from models import User, Project, Workspace
@@ -14,7 +16,10 @@ from vision_service import vision_service
 from ai_usage_service import log_ai_usage
 from attachment_service import attachment_service
 import json
+import orjson
+import logging
 import os
+import shutil
 import uuid
 import time
 
@@ -23,16 +28,78 @@ router = APIRouter(
     tags=["chat"],
 )
 
-# Global storage for pending approvals
-# Key: approval_id, Value: {"event": asyncio.Event, "approved": bool, "tool_name": str, "tool_args": dict}
-pending_approvals: Dict[str, Dict[str, Any]] = {}
+# Per-request tracing is at DEBUG, so it costs nothing at the default INFO level
+logger = logging.getLogger(__name__)
+
+# Instructions shared by every chat request; context sections are appended per request
+_BASE_SYSTEM_PROMPT = """You are a helpful AI assistant for content creation.
+
+CRITICAL FORMATTING RULES:
+1. ALWAYS use Markdown formatting in your responses (not HTML)
+2. Use ## for headings, **bold**, *italic*, - for lists, ` for code
+3. NEVER use HTML tags like <p>, <h1>, <div> in your text responses
+4. When editing documents with edit_document tool, use the format the document already has
+
+IMPORTANT: You have access to powerful tools that allow you to directly edit documents, read files, and perform actions.
+When a user asks you to make changes to a document, you should ALWAYS use the tools (especially edit_document) to make those changes directly,
+rather than just suggesting changes in your response. Taking action is preferred over describing what should be done.
+
+Available actions:
+- When editing content: Use edit_document tool immediately
+- When reading files: Use read_document tool
+- When creating content: Use appropriate tools to create and populate documents
+
+Only provide explanatory text when tools cannot accomplish the task or when the user specifically asks for suggestions."""
+
+@dataclass(slots=True)
+class PendingApproval:
+    event: asyncio.Event
+    approved: bool
+    tool_name: str
+    tool_args: Dict[str, Any]
+
+def _sse(payload: Dict[str, Any]) -> bytes:
+    """Encode one Server-Sent Events data frame."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+# Frames with fixed payloads, encoded once
+_DONE_FRAME = _sse({"type": "done"})
+_STARTING_FRAME = _sse({"type": "status", "message": "Iniciando agente IA..."})
+_CALLING_MODEL_FRAME = _sse({"type": "status", "message": "Consultando modelo de IA..."})
+_CANCELLED_FRAME = _sse({"type": "status", "message": "Operação cancelada pelo usuário."})
+_MAX_ITERATIONS_FRAME = _sse({"type": "status", "message": "Limite de iterações atingido"})
+
+# Global storage for pending approvals, keyed by approval_id
+pending_approvals: Dict[str, PendingApproval] = {}
 
 def get_workspace_id_from_project(db: Session, project_id: Optional[str]) -> Optional[str]:
     """Get workspace_id from project_id."""
     if not project_id:
         return None
-    project = db.query(Project).filter(Project.id == project_id).first()
-    return project.workspace_id if project else None
+    return db.query(Project.workspace_id).filter(Project.id == project_id).scalar()
+
+def get_project_workspace(db: Session, project_id: str) -> Optional[Workspace]:
+    """Get a project's workspace, joined through the project in one query."""
+    return db.query(Workspace).join(
+        Project, Project.workspace_id == Workspace.id
+    ).filter(Project.id == project_id).first()
+
+def get_context_documents(db: Session, document_ids: Optional[List[str]], folder_ids: Optional[List[str]]):
+    """
+    Selected documents plus the live documents inside selected folders, in one
+    query that loads only the columns the prompt uses.
+    """
+    from models import Document as DBDocument
+
+    conditions = []
+    if document_ids:
+        conditions.append(DBDocument.id.in_(document_ids))
+    if folder_ids:
+        conditions.append(and_(DBDocument.folder_id.in_(folder_ids), DBDocument.deleted_at == None))
+    if not conditions:
+        return []
+
+    return db.query(DBDocument.id, DBDocument.title, DBDocument.content).filter(or_(*conditions)).all()
 
 class Attachment(BaseModel):
     type: str  # 'image', 'pdf_text', 'pdf_image'
@@ -89,12 +156,11 @@ async def upload_attachment(
     # Read file content
     file_content = await file.read()
 
-    # Get workspace settings to determine which model to use
-    workspace_id = get_workspace_id_from_project(db, project_id)
+    # Get workspace settings to determine which model to use (project -> workspace in one query)
     attachment_model = None
 
-    if workspace_id:
-        workspace = db.query(Workspace).filter(Workspace.id == workspace_id).first()
+    if project_id:
+        workspace = await asyncio.to_thread(get_project_workspace, db, project_id)
         if workspace and workspace.attachment_analysis_model:
             attachment_model = workspace.attachment_analysis_model
         elif workspace and workspace.default_vision_model:
@@ -118,7 +184,7 @@ async def upload_attachment(
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"❌ Error processing attachment: {e}")
+        logger.error("Error processing attachment: %s", e)
         raise HTTPException(status_code=500, detail="Failed to process attachment")
 
 @router.post("/tool-approval")
@@ -132,20 +198,19 @@ async def respond_to_tool_approval(
     """
     approval_id = response.approval_id
 
-    print(f"📨 Received approval response for: {approval_id}")
-    print(f"📋 Current pending approvals: {list(pending_approvals.keys())}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Received approval response for: %s (pending: %s)", approval_id, list(pending_approvals))
 
     if approval_id not in pending_approvals:
-        print(f"❌ Approval ID {approval_id} not found in pending approvals!")
+        logger.warning("Approval ID %s not found in pending approvals", approval_id)
         raise HTTPException(status_code=404, detail="Approval request not found or expired")
 
     # Update the approval status
-    pending_approvals[approval_id]["approved"] = response.approved
-    print(f"✅ Approval status updated: {response.approved}")
+    pending_approvals[approval_id].approved = response.approved
 
     # Signal the event to unblock the streaming endpoint
-    pending_approvals[approval_id]["event"].set()
-    print(f"🔔 Event signaled for approval: {approval_id}")
+    pending_approvals[approval_id].event.set()
+    logger.debug("Approval %s signaled: %s", approval_id, response.approved)
 
     return {"success": True, "approval_id": approval_id, "approved": response.approved}
 
@@ -155,6 +220,9 @@ async def generate_chat_completion(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    # Looked up once for all usage logging paths below
+    workspace_id = await asyncio.to_thread(get_workspace_id_from_project, db, request.project_id)
+
     # Build messages including attachments
     messages = []
     for m in request.messages:
@@ -162,34 +230,16 @@ async def generate_chat_completion(
 
         # If message has attachments, prepend them to the content
         if m.attachments:
-            attachment_texts = []
-            for att in m.attachments:
-                att_text = f"\n\n**[Attached {att.type.upper()}: {att.filename}]**\n{att.content}\n"
-                attachment_texts.append(att_text)
-
-            msg_content = "".join(attachment_texts) + "\n" + msg_content
+            attachment_text = "".join(
+                f"\n\n**[Attached {att.type.upper()}: {att.filename}]**\n{att.content}\n"
+                for att in m.attachments
+            )
+            msg_content = f"{attachment_text}\n{msg_content}" if msg_content else attachment_text
 
         messages.append({"role": m.role, "content": msg_content})
 
     # Build system prompt with context
-    system_parts = ["""You are a helpful AI assistant for content creation.
-
-CRITICAL FORMATTING RULES:
-1. ALWAYS use Markdown formatting in your responses (not HTML)
-2. Use ## for headings, **bold**, *italic*, - for lists, ` for code
-3. NEVER use HTML tags like <p>, <h1>, <div> in your text responses
-4. When editing documents with edit_document tool, use the format the document already has
-
-IMPORTANT: You have access to powerful tools that allow you to directly edit documents, read files, and perform actions.
-When a user asks you to make changes to a document, you should ALWAYS use the tools (especially edit_document) to make those changes directly,
-rather than just suggesting changes in your response. Taking action is preferred over describing what should be done.
-
-Available actions:
-- When editing content: Use edit_document tool immediately
-- When reading files: Use read_document tool
-- When creating content: Use appropriate tools to create and populate documents
-
-Only provide explanatory text when tools cannot accomplish the task or when the user specifically asks for suggestions."""]
+    system_parts = [_BASE_SYSTEM_PROMPT]
 
     # Add current document context if available
     if request.current_document and request.use_rag:
@@ -205,34 +255,18 @@ You can and should edit this document directly using the edit_document tool when
 
     # Add selected documents context if available
     if request.use_rag and (request.document_ids or request.folder_ids):
-        from models import Document as DBDocument
-
-        # Collect all document IDs (from direct selection and folders)
-        all_doc_ids = list(request.document_ids) if request.document_ids else []
-
-        # Add documents from selected folders
-        if request.folder_ids:
-            folder_docs = db.query(DBDocument).filter(
-                DBDocument.folder_id.in_(request.folder_ids),
-                DBDocument.deleted_at == None
-            ).all()
-            all_doc_ids.extend([doc.id for doc in folder_docs])
+        # Directly selected documents and those in selected folders, in one query
+        selected_docs = await asyncio.to_thread(get_context_documents, db, request.document_ids, request.folder_ids)
 
-        # Remove duplicates
-        all_doc_ids = list(set(all_doc_ids))
+        if selected_docs:
+            system_parts.append("\nSelected Context Documents:")
+            for doc in selected_docs:
+                # Truncate very long documents to avoid token limits
+                content_preview = doc.content[:2000] if doc.content else ""
+                if doc.content and len(doc.content) > 2000:
+                    content_preview += "\n... (content truncated)"
 
-        if all_doc_ids:
-            selected_docs = db.query(DBDocument).filter(DBDocument.id.in_(all_doc_ids)).all()
-
-            if selected_docs:
-                system_parts.append("\nSelected Context Documents:")
-                for doc in selected_docs:
-                    # Truncate very long documents to avoid token limits
-                    content_preview = doc.content[:2000] if doc.content else ""
-                    if doc.content and len(doc.content) > 2000:
-                        content_preview += "\n... (content truncated)"
-
-                    system_parts.append(f"""
+                system_parts.append(f"""
 - Document: {doc.title} (ID: {doc.id})
   Content:
 {content_preview}
@@ -241,7 +275,8 @@ You can and should edit this document directly using the edit_document tool when
     # Add RAG context if available (semantic search when no specific docs selected)
     if request.use_rag and request.project_id and not request.current_document and not request.document_ids:
         last_user_message = messages[-1]["content"]
-        docs = query_knowledge_base(
+        docs = await asyncio.to_thread(
+            query_knowledge_base,
             last_user_message,
             project_id=request.project_id,
             document_ids=request.document_ids if request.document_ids else None
@@ -299,7 +334,7 @@ Retrieved Context:
             log_ai_usage(
                 db=db,
                 user_id=current_user.id,
-                workspace_id=get_workspace_id_from_project(db, request.project_id),
+                workspace_id=workspace_id,
                 project_id=request.project_id,
                 model=request.model,
                 provider="openrouter",  # TODO: Detect from model string
@@ -327,7 +362,7 @@ Retrieved Context:
                 tool_names_used.append(tool_name)
 
             # Execute the tool
-            tool_result = execute_tool(tool_name, tool_args, db)
+            tool_result = await asyncio.to_thread(execute_tool, tool_name, tool_args, db)
 
             # Add tool result to messages
             messages.append({
@@ -347,7 +382,7 @@ Retrieved Context:
     log_ai_usage(
         db=db,
         user_id=current_user.id,
-        workspace_id=get_workspace_id_from_project(db, request.project_id),
+        workspace_id=workspace_id,
         project_id=request.project_id,
         model=request.model,
         provider="openrouter",
@@ -375,15 +410,17 @@ async def generate_chat_completion_stream(
     """
     async def event_generator():
         try:
-            print(f"\n{'='*80}")
-            print(f"🤖 STREAMING CHAT REQUEST STARTED")
-            print(f"{'='*80}")
-            print(f"Model: {request.model}")
-            print(f"Project ID: {request.project_id}")
-            print(f"Use RAG: {request.use_rag}")
-            print(f"Current Document: {request.current_document.id if request.current_document else None}")
-            print(f"Document IDs: {request.document_ids}")
-            print(f"User ID: {current_user.id}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Streaming chat request started: model=%s project_id=%s use_rag=%s "
+                    "current_document=%s document_ids=%s user_id=%s",
+                    request.model, request.project_id, request.use_rag,
+                    request.current_document.id if request.current_document else None,
+                    request.document_ids, current_user.id
+                )
+
+            # Looked up once for all usage logging paths below
+            workspace_id = await asyncio.to_thread(get_workspace_id_from_project, db, request.project_id)
 
             # Build messages including attachments
             messages = []
@@ -392,39 +429,19 @@ async def generate_chat_completion_stream(
 
                 # If message has attachments, prepend them to the content
                 if m.attachments:
-                    attachment_texts = []
-                    for att in m.attachments:
-                        att_text = f"\n\n**[Attached {att.type.upper()}: {att.filename}]**\n{att.content}\n"
-                        attachment_texts.append(att_text)
-
-                    msg_content = "".join(attachment_texts) + "\n" + msg_content
+                    attachment_text = "".join(
+                        f"\n\n**[Attached {att.type.upper()}: {att.filename}]**\n{att.content}\n"
+                        for att in m.attachments
+                    )
+                    msg_content = f"{attachment_text}\n{msg_content}" if msg_content else attachment_text
 
                 messages.append({"role": m.role, "content": msg_content})
 
-            print(f"Messages count: {len(messages)}")
-            if messages:
-                last_msg = messages[-1]['content']
-                print(f"Last user message: {last_msg[:100]}..." if len(last_msg) > 100 else f"Last user message: {last_msg}")
+            if messages and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Messages count: %s, last message: %.100s", len(messages), messages[-1]['content'])
 
             # Build system prompt (same as non-streaming version)
-            system_parts = ["""You are a helpful AI assistant for content creation.
-
-CRITICAL FORMATTING RULES:
-1. ALWAYS use Markdown formatting in your responses (not HTML)
-2. Use ## for headings, **bold**, *italic*, - for lists, ` for code
-3. NEVER use HTML tags like <p>, <h1>, <div> in your text responses
-4. When editing documents with edit_document tool, use the format the document already has
-
-IMPORTANT: You have access to powerful tools that allow you to directly edit documents, read files, and perform actions.
-When a user asks you to make changes to a document, you should ALWAYS use the tools (especially edit_document) to make those changes directly,
-rather than just suggesting changes in your response. Taking action is preferred over describing what should be done.
-
-Available actions:
-- When editing content: Use edit_document tool immediately
-- When reading files: Use read_document tool
-- When creating content: Use appropriate tools to create and populate documents
-
-Only provide explanatory text when tools cannot accomplish the task or when the user specifically asks for suggestions."""]
+            system_parts = [_BASE_SYSTEM_PROMPT]
 
             # Add current document context
             if request.current_document and request.use_rag:
@@ -440,33 +457,17 @@ You can and should edit this document directly using the edit_document tool when
 
             # Add selected documents context
             if request.use_rag and (request.document_ids or request.folder_ids):
-                from models import Document as DBDocument
-
-                # Collect all document IDs (from direct selection and folders)
-                all_doc_ids = list(request.document_ids) if request.document_ids else []
+                # Directly selected documents and those in selected folders, in one query
+                selected_docs = await asyncio.to_thread(get_context_documents, db, request.document_ids, request.folder_ids)
 
-                # Add documents from selected folders
-                if request.folder_ids:
-                    folder_docs = db.query(DBDocument).filter(
-                        DBDocument.folder_id.in_(request.folder_ids),
-                        DBDocument.deleted_at == None
-                    ).all()
-                    all_doc_ids.extend([doc.id for doc in folder_docs])
+                if selected_docs:
+                    system_parts.append("\nSelected Context Documents:")
+                    for doc in selected_docs:
+                        content_preview = doc.content[:2000] if doc.content else ""
+                        if doc.content and len(doc.content) > 2000:
+                            content_preview += "\n... (content truncated)"
 
-                # Remove duplicates
-                all_doc_ids = list(set(all_doc_ids))
-
-                if all_doc_ids:
-                    selected_docs = db.query(DBDocument).filter(DBDocument.id.in_(all_doc_ids)).all()
-
-                    if selected_docs:
-                        system_parts.append("\nSelected Context Documents:")
-                        for doc in selected_docs:
-                            content_preview = doc.content[:2000] if doc.content else ""
-                            if doc.content and len(doc.content) > 2000:
-                                content_preview += "\n... (content truncated)"
-
-                            system_parts.append(f"""
+                        system_parts.append(f"""
 - Document: {doc.title} (ID: {doc.id})
   Content:
 {content_preview}
@@ -475,7 +476,8 @@ You can and should edit this document directly using the edit_document tool when
             # Add RAG context
             if request.use_rag and request.project_id and not request.current_document and not request.document_ids:
                 last_user_message = messages[-1]["content"]
-                docs = query_knowledge_base(
+                docs = await asyncio.to_thread(
+                    query_knowledge_base,
                     last_user_message,
                     project_id=request.project_id,
                     document_ids=request.document_ids if request.document_ids else None
@@ -495,7 +497,7 @@ Retrieved Context:
                 messages.insert(0, {"role": "system", "content": system_prompt})
 
             # Send initial status
-            yield f"data: {json.dumps({'type': 'status', 'message': 'Iniciando agente IA...'})}\n\n"
+            yield _STARTING_FRAME
             await asyncio.sleep(0.1)  # Small delay for client to connect
 
             # Tool calling loop with streaming updates
@@ -508,17 +510,16 @@ Retrieved Context:
 
             while iteration < max_iterations:
                 iteration += 1
-                print(f"\n📍 Iteration {iteration}/{max_iterations}")
+                logger.debug("Iteration %s/%s", iteration, max_iterations)
 
                 # Send iteration status
-                yield f"data: {json.dumps({'type': 'iteration', 'current': iteration, 'max': max_iterations})}\n\n"
+                yield _sse({'type': 'iteration', 'current': iteration, 'max': max_iterations})
 
                 # Send LLM call status
-                print(f"⚡ Sending 'Consultando modelo de IA...' status")
-                yield f"data: {json.dumps({'type': 'status', 'message': 'Consultando modelo de IA...'})}\n\n"
+                yield _CALLING_MODEL_FRAME
 
                 # Call LLM with streaming
-                print(f"🔄 Calling LLM with model: {request.model} (streaming)")
+                logger.debug("Calling LLM with model: %s (streaming)", request.model)
                 llm_start = time.time()
 
                 # Accumulate streaming response
@@ -542,7 +543,7 @@ Retrieved Context:
                                 content_chunk = delta["content"]
                                 accumulated_content += content_chunk
                                 # Send content chunk immediately
-                                yield f"data: {json.dumps({'type': 'message_chunk', 'content': content_chunk})}\n\n"
+                                yield _sse({'type': 'message_chunk', 'content': content_chunk})
 
                             # Accumulate tool calls
                             if "tool_calls" in delta:
@@ -572,19 +573,19 @@ Retrieved Context:
                             usage = chunk["usage"]
 
                     llm_duration = int((time.time() - llm_start) * 1000)
-                    print(f"✅ LLM streaming completed in {llm_duration}ms")
+                    logger.debug("LLM streaming completed in %sms", llm_duration)
 
                 except Exception as e:
-                    print(f"❌ LLM call failed: {str(e)}")
+                    logger.error("LLM call failed: %s", e)
                     raise
 
                 # Send LLM timing
-                yield f"data: {json.dumps({'type': 'timing', 'duration_ms': llm_duration, 'step': 'llm_call'})}\n\n"
+                yield _sse({'type': 'timing', 'duration_ms': llm_duration, 'step': 'llm_call'})
 
                 # Track token usage
                 total_input_tokens += usage.get("prompt_tokens", 0)
                 total_output_tokens += usage.get("completion_tokens", 0)
-                print(f"📊 Tokens - Input: {usage.get('prompt_tokens', 0)}, Output: {usage.get('completion_tokens', 0)}")
+                logger.debug("Tokens - input: %s, output: %s", usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
 
                 # Build response message from accumulated data
                 response_message = {
@@ -596,12 +597,12 @@ Retrieved Context:
                     response_message["tool_calls"] = accumulated_tool_calls
 
                 tool_calls = accumulated_tool_calls
-                print(f"🔧 Tool calls: {len(tool_calls) if tool_calls else 0}")
+                logger.debug("Tool calls: %s", len(tool_calls))
 
                 if not tool_calls:
                     # No tools, send usage and done
                     # Send usage stats
-                    yield f"data: {json.dumps({'type': 'usage', 'data': usage})}\n\n"
+                    yield _sse({'type': 'usage', 'data': usage})
 
                     # Log AI usage
                     duration_ms = int((time.time() - start_time) * 1000)
@@ -610,7 +611,7 @@ Retrieved Context:
                     log_ai_usage(
                         db=db,
                         user_id=current_user.id,
-                        workspace_id=get_workspace_id_from_project(db, request.project_id),
+                        workspace_id=workspace_id,
                         project_id=request.project_id,
                         model=request.model,
                         provider="openrouter",
@@ -624,7 +625,7 @@ Retrieved Context:
                     )
 
                     # Send done signal
-                    yield f"data: {json.dumps({'type': 'done'})}\n\n"
+                    yield _DONE_FRAME
                     break
 
                 # Add assistant message to history
@@ -641,18 +642,18 @@ Retrieved Context:
 
                     # Create approval request
                     approval_id = str(uuid.uuid4())
-                    approval_event = asyncio.Event()
+                    pending = PendingApproval(
+                        event=asyncio.Event(),
+                        approved=False,
+                        tool_name=tool_name,
+                        tool_args=tool_args
+                    )
 
                     # Store pending approval
-                    pending_approvals[approval_id] = {
-                        "event": approval_event,
-                        "approved": False,
-                        "tool_name": tool_name,
-                        "tool_args": tool_args
-                    }
+                    pending_approvals[approval_id] = pending
 
                     # Send approval request to frontend
-                    approval_request_data = json.dumps({
+                    approval_request_data = _sse({
                         'type': 'tool_approval_request',
                         'approval_id': approval_id,
                         'tool': tool_name,
@@ -660,30 +661,29 @@ Retrieved Context:
                         'index': i + 1,
                         'total': len(tool_calls)
                     })
-                    yield f"data: {approval_request_data}\n\n"
-                    print(f"🔔 Waiting for approval for tool: {tool_name}")
+                    yield approval_request_data
+                    logger.debug("Waiting for approval for tool: %s", tool_name)
 
                     # Wait for user approval (with timeout)
                     try:
-                        await asyncio.wait_for(approval_event.wait(), timeout=300.0)  # 5 min timeout
+                        await asyncio.wait_for(pending.event.wait(), timeout=300.0)  # 5 min timeout
                     except asyncio.TimeoutError:
                         # Timeout - treat as rejection
-                        pending_approvals[approval_id]["approved"] = False
-                        print(f"⏱️ Approval timeout for tool: {tool_name}")
+                        pending.approved = False
+                        logger.debug("Approval timeout for tool: %s", tool_name)
 
                     # Check if approved
-                    approved = pending_approvals[approval_id].get("approved", False)
+                    approved = pending.approved
 
                     # Clean up
-                    if approval_id in pending_approvals:
-                        del pending_approvals[approval_id]
+                    pending_approvals.pop(approval_id, None)
 
                     if not approved:
                         # User rejected - stop execution
-                        print(f"❌ User rejected tool: {tool_name}")
-                        yield f"data: {json.dumps({'type': 'tool_rejected', 'tool': tool_name})}\n\n"
-                        yield f"data: {json.dumps({'type': 'status', 'message': 'Operação cancelada pelo usuário.'})}\n\n"
-                        yield f"data: {json.dumps({'type': 'done'})}\n\n"
+                        logger.debug("User rejected tool: %s", tool_name)
+                        yield _sse({'type': 'tool_rejected', 'tool': tool_name})
+                        yield _CANCELLED_FRAME
+                        yield _DONE_FRAME
 
                         # Log usage before stopping
                         duration_ms = int((time.time() - start_time) * 1000)
@@ -691,7 +691,7 @@ Retrieved Context:
                         log_ai_usage(
                             db=db,
                             user_id=current_user.id,
-                            workspace_id=get_workspace_id_from_project(db, request.project_id),
+                            workspace_id=workspace_id,
                             project_id=request.project_id,
                             model=request.model,
                             provider="openrouter",
@@ -706,18 +706,18 @@ Retrieved Context:
                         return  # Stop execution completely
 
                     # Approved - execute tool
-                    print(f"✅ User approved tool: {tool_name}")
-                    yield f"data: {json.dumps({'type': 'tool_approved', 'tool': tool_name})}\n\n"
+                    logger.debug("User approved tool: %s", tool_name)
+                    yield _sse({'type': 'tool_approved', 'tool': tool_name})
 
                     # Send tool start event
-                    event_data = json.dumps({
+                    event_data = _sse({
                         'type': 'tool_start',
                         'tool': tool_name,
                         'args': tool_args,
                         'index': i + 1,
                         'total': len(tool_calls)
                     })
-                    yield f"data: {event_data}\n\n"
+                    yield event_data
 
                     # Execute tool with project_id injection
                     tool_start = time.time()
@@ -725,17 +725,17 @@ Retrieved Context:
                         # Inject actual project_id if tool expects it
                         if "project_id" in tool_args and request.project_id:
                             tool_args["project_id"] = request.project_id
-                        tool_result = execute_tool(tool_name, tool_args, db)
+                        tool_result = await asyncio.to_thread(execute_tool, tool_name, tool_args, db)
                         tool_duration = int((time.time() - tool_start) * 1000)
 
                         # Send tool complete event
-                        complete_data = json.dumps({
+                        complete_data = _sse({
                             'type': 'tool_complete',
                             'tool': tool_name,
                             'result': str(tool_result)[:200],  # Truncate for brevity
                             'duration_ms': tool_duration
                         })
-                        yield f"data: {complete_data}\n\n"
+                        yield complete_data
 
                         # Add tool result to messages
                         messages.append({
@@ -745,17 +745,19 @@ Retrieved Context:
                             "content": json.dumps(tool_result)
                         })
                     except Exception as e:
+                        # A failed statement aborts the transaction; later tool calls need a clean session
+                        await asyncio.to_thread(db.rollback)
                         tool_duration = int((time.time() - tool_start) * 1000)
                         error_message = str(e)
 
                         # Send tool error event
-                        error_data = json.dumps({
+                        error_data = _sse({
                             'type': 'tool_error',
                             'tool': tool_name,
                             'error': error_message,
                             'duration_ms': tool_duration
                         })
-                        yield f"data: {error_data}\n\n"
+                        yield error_data
 
                         # Add error result to messages
                         messages.append({
@@ -767,7 +769,7 @@ Retrieved Context:
 
             # If max iterations reached
             if iteration >= max_iterations:
-                yield f"data: {json.dumps({'type': 'status', 'message': 'Limite de iterações atingido'})}\n\n"
+                yield _MAX_ITERATIONS_FRAME
 
                 # Log usage
                 duration_ms = int((time.time() - start_time) * 1000)
@@ -777,7 +779,7 @@ Retrieved Context:
                 log_ai_usage(
                     db=db,
                     user_id=current_user.id,
-                    workspace_id=None,
+                    workspace_id=workspace_id,
                     project_id=request.project_id,
                     model=request.model,
                     provider="openrouter",
@@ -790,11 +792,11 @@ Retrieved Context:
                     duration_ms=duration_ms
                 )
 
-                yield f"data: {json.dumps({'type': 'done'})}\n\n"
+                yield _DONE_FRAME
 
         except Exception as e:
             error_msg = str(e)
-            yield f"data: {json.dumps({'type': 'error', 'message': error_msg})}\n\n"
+            yield _sse({'type': 'error', 'message': error_msg})
 
     return StreamingResponse(
         event_generator(),
@@ -825,12 +827,12 @@ async def analyze_image_with_vision(
     temp_path = os.path.join(TEMP_IMAGE_DIR, temp_filename)
 
     try:
+        # Stream the spooled upload to disk in chunks instead of buffering it whole
         with open(temp_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+            await asyncio.to_thread(shutil.copyfileobj, file.file, buffer, 1024 * 1024)
 
         # Analyze with vision service
-        result = vision_service.analyze_image(temp_path, prompt)
+        result = await asyncio.to_thread(vision_service.analyze_image, temp_path, prompt)
 
         # Clean up temp file
         os.remove(temp_path)
@@ -867,7 +869,7 @@ async def analyze_document_image(
     from models import Document as DBDocument
 
     # Get document from database
-    doc = db.query(DBDocument).filter(DBDocument.id == request.document_id).first()
+    doc = await asyncio.to_thread(db.get, DBDocument, request.document_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
 
@@ -885,7 +887,7 @@ async def analyze_document_image(
         raise HTTPException(status_code=404, detail="Image file not found in storage")
 
     # Analyze with vision service
-    result = vision_service.analyze_image(temp_path, request.prompt)
+    result = await asyncio.to_thread(vision_service.analyze_image, temp_path, request.prompt)
 
     if not result or not result.get("success"):
         raise HTTPException(
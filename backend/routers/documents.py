@@ -1,20 +1,19 @@
-from fastapi import APIRouter, Depends, UploadFile, File, BackgroundTasks, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
 from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 from database import get_db
-from models import Document, User
+from models import Document, User, generate_uuid
 from schemas import DocumentCreate, DocumentUpdate, Document as DocumentSchema
 from auth import get_current_user
-from rag_service import process_document
+from rag_service import submit_document
 from crud import (
     get_project_documents, get_document, create_document, update_document, delete_document,
     soft_delete_document, restore_document, move_document, list_archived_documents
 )
 import shutil
 import os
-import uuid
 import secrets
 from export_service import export_to_pdf, export_to_docx, export_to_markdown
 
@@ -29,13 +28,12 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 @router.post("/upload/{project_id}")
 async def upload_document(
     project_id: str,
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     # Create DB entry
-    doc_id = str(uuid.uuid4())
+    doc_id = generate_uuid()
     db_doc = Document(
         id=doc_id,
         title=file.filename,
@@ -51,8 +49,8 @@ async def upload_document(
     with open(temp_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
 
-    # Trigger background processing
-    background_tasks.add_task(process_document, db, doc_id, temp_path, file.filename)
+    # Queue for ingestion; the worker opens its own session (this one closes with the request)
+    submit_document(doc_id, temp_path, file.filename)
 
     return {"id": doc_id, "status": "processing", "message": "Document uploaded and processing started"}
 
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from database import get_db
-from models import User, Template as TemplateModel
+from models import User, Template as TemplateModel, generate_uuid
 from schemas import Template, TemplateCreate, TemplateUpdate
 from auth import get_current_user
-import uuid
 
 router = APIRouter(
     prefix="/templates",
@@ -17,6 +17,7 @@ router = APIRouter(
 def list_templates(
     workspace_id: Optional[str] = None,
     category: Optional[str] = None,
+    search: Optional[str] = None,
     include_system: bool = True,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -50,6 +51,10 @@ def list_templates(
     if category:
         query = query.filter(TemplateModel.category == category)
 
+    # Partial name match (served by the trigram index)
+    if search:
+        query = query.filter(TemplateModel.name.ilike(f"%{search}%"))
+
     # Order by usage count (most popular first), then by created_at
     query = query.order_by(
         TemplateModel.is_system.desc(),  # System templates first
@@ -91,7 +96,7 @@ def create_template(
     Templates are scoped to workspace if workspace_id is provided.
     """
     new_template = TemplateModel(
-        id=str(uuid.uuid4()),
+        id=generate_uuid(),
         workspace_id=workspace_id,
         user_id=current_user.id,
         name=template.name,
@@ -669,25 +674,26 @@ Investimento: $Preço real
             ).count()
         }
 
-    # Create all templates
-    created_count = 0
-    for template_data in expert_templates:
-        template = TemplateModel(
-            id=str(uuid.uuid4()),
-            workspace_id=workspace_id,
-            user_id=None,  # Workspace template, not user-specific
-            name=template_data["name"],
-            description=template_data["description"],
-            category=template_data["category"],
-            icon=template_data["icon"],
-            prompt=template_data["prompt"],
-            tags=template_data["tags"],
-            is_system=False,
-            is_active=True,
-            usage_count=0
-        )
-        db.add(template)
-        created_count += 1
+    # Create all templates in a single multi-row INSERT
+    rows = [
+        {
+            "id": generate_uuid(),
+            "workspace_id": workspace_id,
+            "user_id": None,  # Workspace template, not user-specific
+            "name": template_data["name"],
+            "description": template_data["description"],
+            "category": template_data["category"],
+            "icon": template_data["icon"],
+            "prompt": template_data["prompt"],
+            "tags": template_data["tags"],
+            "is_system": False,
+            "is_active": True,
+            "usage_count": 0
+        }
+        for template_data in expert_templates
+    ]
+    db.execute(insert(TemplateModel), rows)
+    created_count = len(rows)
 
     db.commit()
 
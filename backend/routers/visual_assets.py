@@ -5,18 +5,17 @@ for use as context/input in AI image generation
 """
 
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Form
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, defer
 from typing import List, Optional
 from datetime import datetime
-import uuid
 import io
 from PIL import Image
 import os
 
 from database import get_db
-from models import User, Document, Project
+from models import User, Document, Project, generate_uuid
 from auth import get_current_user
-from minio_service import upload_file
+from minio_service import upload_file_async
 
 router = APIRouter()
 
@@ -128,9 +127,10 @@ async def upload_visual_asset(
             detail=f"Invalid file format. Allowed formats: PNG, JPEG, WebP"
         )
 
-    # Read file content
-    file_content = await file.read()
-    file_size = len(file_content)
+    # Determine size from the spooled upload without reading it into memory
+    file.file.seek(0, os.SEEK_END)
+    file_size = file.file.tell()
+    file.file.seek(0)
 
     # Validate file size
     if file_size > MAX_FILE_SIZE:
@@ -141,7 +141,7 @@ async def upload_visual_asset(
 
     try:
         # Load image with Pillow
-        image = Image.open(io.BytesIO(file_content))
+        image = Image.open(file.file)
 
         # Extract metadata
         file_format = image.format or file.filename.split('.')[-1].upper()
@@ -156,7 +156,7 @@ async def upload_visual_asset(
         thumbnail_bytes = generate_thumbnail(image)
 
         # Generate unique ID
-        asset_id = str(uuid.uuid4())
+        asset_id = generate_uuid()
 
         # Determine file extension
         file_ext = file.filename.split('.')[-1] if '.' in file.filename else 'png'
@@ -164,17 +164,19 @@ async def upload_visual_asset(
         # Upload original to MinIO
         original_filename = f"{asset_id}.{file_ext}"
         original_folder = f"projects/{project_id}/assets/{asset_type}"
-        original_url = upload_file(
-            file_data=file_content,
+        file.file.seek(0)
+        original_url = await upload_file_async(
+            file_data=file.file,
             file_name=original_filename,
             content_type=file.content_type,
-            folder=original_folder
+            folder=original_folder,
+            length=file_size
         )
 
         # Upload thumbnail to MinIO
         thumbnail_filename = f"{asset_id}_thumb.webp"
         thumbnail_folder = f"projects/{project_id}/assets/{asset_type}/thumbnails"
-        thumbnail_url = upload_file(
+        thumbnail_url = await upload_file_async(
             file_data=thumbnail_bytes,
             file_name=thumbnail_filename,
             content_type="image/webp",
@@ -253,7 +255,11 @@ async def list_visual_assets(
         raise HTTPException(status_code=404, detail="Project not found")
 
     # Build query
-    query = db.query(Document).filter(
+    query = db.query(Document).options(
+        # The library listing never shows the body or generation params
+        defer(Document.content),
+        defer(Document.generation_metadata)
+    ).filter(
         Document.project_id == project_id,
         Document.is_reference_asset == True,
         Document.deleted_at == None  # Exclude soft-deleted
@@ -277,10 +283,10 @@ async def list_visual_assets(
     # Filter by tags (if any tag matches)
     if tags:
         tag_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
-        # JSONB contains operator - check if any tag is in the tags array
+        # JSONB containment (@>) on the tags path - served by the expression GIN index
         for tag in tag_list:
             query = query.filter(
-                Document.asset_metadata['tags'].astext.contains(tag)
+                Document.asset_metadata["tags"].contains([tag])
             )
 
     # Order by creation date (newest first)
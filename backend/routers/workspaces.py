@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List
 from pydantic import BaseModel
@@ -10,7 +11,8 @@ from crud import (
     get_workspace
 )
 from auth import get_current_user
-from models import User
+from models import User, WorkspaceUser
+from workspace_events import subscribe
 
 router = APIRouter(
     prefix="/workspaces",
@@ -109,3 +111,29 @@ def remove_member_from_workspace(
         raise HTTPException(status_code=400, detail="Cannot remove member (user not found or is owner)")
 
     return {"message": "Member removed successfully"}
+
+@router.get("/{workspace_id}/events")
+async def stream_workspace_events(
+    workspace_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Server-Sent Events fired when projects or documents in the workspace change"""
+    is_member = db.query(WorkspaceUser.user_id).filter(
+        WorkspaceUser.workspace_id == workspace_id,
+        WorkspaceUser.user_id == current_user.id
+    ).first()
+    # Release the pooled connection now rather than holding it for the life of the stream
+    db.close()
+    if not is_member:
+        raise HTTPException(status_code=403, detail="Not a member of this workspace")
+
+    async def event_generator():
+        async for changed in subscribe(workspace_id):
+            yield 'data: {"type": "changed"}\n\n' if changed else ": keepalive\n\n"
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
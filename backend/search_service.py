@@ -5,12 +5,18 @@ Tavily is optimized for AI agents and provides high-quality, concise search resu
 """
 
 import os
+import atexit
 import httpx
 from typing import List, Dict, Any, Optional
 
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY", "")
 TAVILY_BASE_URL = "https://api.tavily.com"
 
+# Shared clients keep connections to Tavily alive between searches
+_http_client = httpx.AsyncClient(timeout=30.0)
+_sync_http_client = httpx.Client(timeout=30.0)
+atexit.register(_sync_http_client.close)
+
 
 class SearchService:
     """Web search service using Tavily API"""
@@ -62,21 +68,20 @@ class SearchService:
             payload["exclude_domains"] = exclude_domains
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{TAVILY_BASE_URL}/search",
-                    json=payload
-                )
-                response.raise_for_status()
-                data = response.json()
-
-                return {
-                    "success": True,
-                    "query": query,
-                    "answer": data.get("answer", ""),
-                    "results": data.get("results", []),
-                    "images": data.get("images", [])
-                }
+            response = await _http_client.post(
+                f"{TAVILY_BASE_URL}/search",
+                json=payload
+            )
+            response.raise_for_status()
+            data = response.json()
+
+            return {
+                "success": True,
+                "query": query,
+                "answer": data.get("answer", ""),
+                "results": data.get("results", []),
+                "images": data.get("images", [])
+            }
 
         except httpx.HTTPStatusError as e:
             error_msg = f"HTTP error: {e.response.status_code}"
@@ -231,31 +236,30 @@ def web_search_sync(
 
     try:
         # Use synchronous httpx client
-        with httpx.Client(timeout=30.0) as client:
-            response = client.post(
-                f"{TAVILY_BASE_URL}/search",
-                json=payload
-            )
-            response.raise_for_status()
-            data = response.json()
+        response = _sync_http_client.post(
+            f"{TAVILY_BASE_URL}/search",
+            json=payload
+        )
+        response.raise_for_status()
+        data = response.json()
 
-            # Format results for AI consumption
-            formatted_results = {
-                "query": query,
-                "answer": data.get("answer", ""),
-                "sources": [
-                    {
-                        "title": r.get("title", ""),
-                        "url": r.get("url", ""),
-                        "content": r.get("content", "")[:500],  # Truncate to 500 chars
-                        "score": r.get("score", 0.0)
-                    }
-                    for r in data.get("results", [])
-                ],
-                "result_count": len(data.get("results", []))
-            }
+        # Format results for AI consumption
+        formatted_results = {
+            "query": query,
+            "answer": data.get("answer", ""),
+            "sources": [
+                {
+                    "title": r.get("title", ""),
+                    "url": r.get("url", ""),
+                    "content": r.get("content", "")[:500],  # Truncate to 500 chars
+                    "score": r.get("score", 0.0)
+                }
+                for r in data.get("results", [])
+            ],
+            "result_count": len(data.get("results", []))
+        }
 
-            return formatted_results
+        return formatted_results
 
     except httpx.HTTPStatusError as e:
         error_msg = f"HTTP error: {e.response.status_code}"
@@ -5,9 +5,9 @@ Expert-level templates for advertising agency and paid traffic specialists.
 Inspired by: David Ogilvy, Gary Vaynerchuk, Seth Godin, Neil Patel, Ryan Deiss.
 """
 
+from sqlalchemy import insert
 from database import SessionLocal
-from models import Template
-import uuid
+from models import Template, generate_uuid
 
 SYSTEM_TEMPLATES = [
     # === ANÚNCIOS / ADS ===
@@ -658,22 +658,23 @@ def seed_templates():
 
         print("📝 Seeding system templates...")
 
-        for template_data in SYSTEM_TEMPLATES:
-            template = Template(
-                id=str(uuid.uuid4()),
-                workspace_id=None,  # Global template
-                user_id=None,  # System template
-                name=template_data["name"],
-                description=template_data["description"],
-                category=template_data["category"],
-                icon=template_data["icon"],
-                prompt=template_data["prompt"],
-                tags=template_data["tags"],
-                is_system=True,
-                is_active=True,
-                usage_count=0
-            )
-            db.add(template)
+        db.execute(insert(Template), [
+            {
+                "id": generate_uuid(),
+                "workspace_id": None,  # Global template
+                "user_id": None,  # System template
+                "name": template_data["name"],
+                "description": template_data["description"],
+                "category": template_data["category"],
+                "icon": template_data["icon"],
+                "prompt": template_data["prompt"],
+                "tags": template_data["tags"],
+                "is_system": True,
+                "is_active": True,
+                "usage_count": 0
+            }
+            for template_data in SYSTEM_TEMPLATES
+        ])
 
         db.commit()
         print(f"✅ Successfully seeded {len(SYSTEM_TEMPLATES)} system templates!")
@@ -0,0 +1,78 @@
+"""
+Text Splitting
+
+Chunking of extracted document text for the knowledge base. Splitting is a
+pure-Python CPU pass, so multi-page documents are split page by page on a
+process pool instead of holding the GIL in the ingest threads.
+
+Kept separate from rag_service so pool workers only import the splitter.
+"""
+
+import copy
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from langchain_core.documents import Document as LangchainDocument
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# Below this many pages the pickling round trip costs more than it saves
+SPLIT_PARALLEL_MIN_PAGES = 8
+SPLIT_WORKERS = int(os.getenv("SPLIT_WORKERS", str(os.cpu_count() or 1)))
+
+_text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+_split_pool: Optional[ProcessPoolExecutor] = None
+_split_pool_lock = threading.Lock()
+
+
+def _split_text(text: str) -> List[str]:
+    return _text_splitter.split_text(text)
+
+
+def _get_split_pool() -> ProcessPoolExecutor:
+    global _split_pool
+    if _split_pool is not None:
+        return _split_pool
+    with _split_pool_lock:
+        if _split_pool is None:
+            # spawn, not fork: the API process is multi-threaded
+            _split_pool = ProcessPoolExecutor(
+                max_workers=SPLIT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+    return _split_pool
+
+
+def split_documents(docs: List[LangchainDocument]) -> List[LangchainDocument]:
+    """
+    Split documents into chunks, in parallel across processes for long documents.
+    Same output as RecursiveCharacterTextSplitter.split_documents.
+    """
+    if len(docs) < SPLIT_PARALLEL_MIN_PAGES or SPLIT_WORKERS < 2:
+        return _text_splitter.split_documents(docs)
+
+    # Only the page text crosses the process boundary; metadata stays here
+    chunks_per_page = _get_split_pool().map(
+        _split_text,
+        [doc.page_content for doc in docs],
+        chunksize=max(1, len(docs) // (SPLIT_WORKERS * 4))
+    )
+
+    splits = []
+    for doc, chunks in zip(docs, chunks_per_page):
+        for chunk in chunks:
+            splits.append(LangchainDocument(page_content=chunk, metadata=copy.deepcopy(doc.metadata)))
+    return splits
+
+
+def shutdown_split_pool():
+    global _split_pool
+    if _split_pool is not None:
+        _split_pool.shutdown(wait=False, cancel_futures=True)
+        _split_pool = None
@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 from models import Document, Folder
 from crud import (
-    get_document, get_project_documents, update_document, create_document,
+    is_valid_uuid, get_document, get_project_documents, update_document, create_document,
     create_folder, list_folders, move_document, move_folder,
     soft_delete_document, soft_delete_folder
 )
@@ -717,6 +717,11 @@ def execute_tool(
     Returns:
         Tool execution result
     """
+    # Model-supplied ids that aren't UUIDs can't match anything
+    for key, value in tool_args.items():
+        if key.endswith("_id") and value not in (None, "", "null") and not is_valid_uuid(value):
+            return {"error": f"{key.replace('_', ' ').capitalize()} {value} not found"}
+
     if tool_name == "read_document":
         return read_document_tool(db, tool_args["document_id"])
     
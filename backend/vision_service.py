@@ -14,6 +14,15 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
 # Model selection by cost/quality
 VISION_MODEL = os.getenv("VISION_MODEL", "claude-3-haiku-20240307")
+
+# Image media type by file suffix (unknown suffixes are sent as JPEG)
+IMAGE_MEDIA_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp'
+}
 # Options:
 # - "claude-3-5-sonnet-20241022" (best quality, $3/$15)
 # - "claude-3-haiku-20240307" (best cost/benefit, $0.25/$1.25) ⭐ RECOMMENDED
@@ -89,16 +98,8 @@ class VisionService:
             }
 
         # Get image format
-        import os
         ext = os.path.splitext(image_path)[1].lower()
-        media_type_map = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.gif': 'image/gif',
-            '.webp': 'image/webp'
-        }
-        media_type = media_type_map.get(ext, 'image/jpeg')
+        media_type = IMAGE_MEDIA_TYPES.get(ext, 'image/jpeg')
 
         try:
             if self.provider in ["anthropic", "openrouter"]:
@@ -213,13 +214,7 @@ class VisionService:
                 continue
 
             ext = os.path.splitext(image_path)[1].lower()
-            media_type = {
-                '.jpg': 'image/jpeg',
-                '.jpeg': 'image/jpeg',
-                '.png': 'image/png',
-                '.gif': 'image/gif',
-                '.webp': 'image/webp'
-            }.get(ext, 'image/jpeg')
+            media_type = IMAGE_MEDIA_TYPES.get(ext, 'image/jpeg')
 
             content.append({
                 "type": "image",
@@ -0,0 +1,108 @@
+"""
+Workspace Change Events
+
+Triggers on projects and documents NOTIFY the workspace_changes channel with the
+affected workspace id. Each process holds one LISTEN connection and fans the
+notifications out to the SSE subscribers of that workspace, so clients refetch
+on change instead of polling.
+"""
+
+import asyncio
+import select
+import threading
+from typing import AsyncIterator, Dict, Optional, Set
+
+import psycopg2
+import psycopg2.extensions
+
+from database import DATABASE_URL
+
+CHANNEL = "workspace_changes"
+KEEPALIVE_SECONDS = 25
+RECONNECT_SECONDS = 5
+
+_subscribers: Dict[str, Set[asyncio.Queue]] = {}
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_stop = threading.Event()
+_listener_thread: Optional[threading.Thread] = None
+
+
+def _publish(workspace_id: str):
+    """Wake the subscribers of a workspace (runs on the event loop)."""
+    for queue in _subscribers.get(workspace_id, ()):
+        # One pending event already means "refetch", so extra ones are dropped
+        if not queue.full():
+            queue.put_nowait(workspace_id)
+
+
+def _publish_all():
+    """Wake every subscriber, e.g. after a reconnect may have missed notifications."""
+    for workspace_id in list(_subscribers):
+        _publish(workspace_id)
+
+
+def _listen_forever():
+    while not _stop.is_set():
+        conn = None
+        try:
+            conn = psycopg2.connect(DATABASE_URL)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL}")
+            print(f"✓ Listening for {CHANNEL} notifications")
+            _loop.call_soon_threadsafe(_publish_all)
+
+            while not _stop.is_set():
+                if select.select([conn], [], [], RECONNECT_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    _loop.call_soon_threadsafe(_publish, notify.payload)
+        except Exception as e:
+            print(f"✗ Workspace change listener error: {e}")
+            _stop.wait(RECONNECT_SECONDS)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def start_listener(loop: asyncio.AbstractEventLoop):
+    """Start the LISTEN thread; notifications are dispatched on the given loop."""
+    global _loop, _listener_thread
+    if _listener_thread is not None:
+        return
+    _loop = loop
+    _stop.clear()
+    _listener_thread = threading.Thread(target=_listen_forever, name="workspace-events", daemon=True)
+    _listener_thread.start()
+
+
+def stop_listener():
+    global _listener_thread
+    _stop.set()
+    if _listener_thread is not None:
+        _listener_thread.join(timeout=RECONNECT_SECONDS + 1)
+        _listener_thread = None
+
+
+async def subscribe(workspace_id: str) -> AsyncIterator[bool]:
+    """
+    Yield True when the workspace changes, or False every KEEPALIVE_SECONDS
+    of silence so the caller can keep the connection open.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+    _subscribers.setdefault(workspace_id, set()).add(queue)
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                yield True
+            except asyncio.TimeoutError:
+                yield False
+    finally:
+        queues = _subscribers.get(workspace_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del _subscribers[workspace_id]
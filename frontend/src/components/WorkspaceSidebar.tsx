@@ -4,6 +4,7 @@ import { useState, useEffect, useMemo } from "react"
 import { useRouter, useParams } from "next/navigation"
 import api from "@/lib/api"
 import { useAuthStore } from "@/lib/store"
+import { useWorkspaceEvents } from "@/hooks/useWorkspaceEvents"
 import { Button } from "@/components/ui/button"
 import { Input } from "@/components/ui/input"
 import { ScrollArea } from "@/components/ui/scroll-area"
@@ -85,14 +86,12 @@ export default function WorkspaceSidebar({ className, onDocumentNavigate }: Work
   useEffect(() => {
     if (token && workspaceId) {
       fetchWorkspaceData()
-      // Refresh data every 5 seconds to catch document title changes
-      const interval = setInterval(() => {
-        fetchWorkspaceData()
-      }, 5000)
-      return () => clearInterval(interval)
     }
   }, [token, workspaceId])
 
+  // Refetch when the server reports project/document changes (titles, moves, new docs)
+  useWorkspaceEvents(workspaceId, token, () => fetchWorkspaceData())
+
   // Fetch user data on mount
   useEffect(() => {
     if (token && !user) {
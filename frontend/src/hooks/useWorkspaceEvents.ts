@@ -0,0 +1,75 @@
+import { useEffect, useRef } from 'react'
+
+const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'
+const RECONNECT_DELAY_MS = 5000
+
+/**
+ * Subscribe to the workspace change stream (Server-Sent Events).
+ * onChange runs whenever projects or documents in the workspace change,
+ * and after every reconnect so events missed while disconnected are caught up.
+ */
+export function useWorkspaceEvents(
+    workspaceId: string | null,
+    token: string | null,
+    onChange: () => void
+) {
+    const onChangeRef = useRef(onChange)
+
+    useEffect(() => {
+        onChangeRef.current = onChange
+    }, [onChange])
+
+    useEffect(() => {
+        if (!workspaceId || !token) return
+
+        const controller = new AbortController()
+        let retryTimer: ReturnType<typeof setTimeout> | undefined
+
+        const connect = async () => {
+            try {
+                // fetch instead of EventSource so the bearer token can be sent
+                const response = await fetch(`${API_URL}/workspaces/${workspaceId}/events`, {
+                    headers: { 'Authorization': `Bearer ${token}` },
+                    signal: controller.signal
+                })
+
+                const reader = response.body?.getReader()
+                if (!response.ok || !reader) throw new Error(`HTTP error! status: ${response.status}`)
+
+                const decoder = new TextDecoder()
+                let buffer = ""
+
+                while (true) {
+                    const { done, value } = await reader.read()
+                    if (done) break
+
+                    buffer += decoder.decode(value, { stream: true })
+                    const events = buffer.split('\n\n')
+                    buffer = events.pop() || ""
+
+                    // Keepalives are comments; any data event means "refetch"
+                    if (events.some(event => event.startsWith('data: '))) {
+                        onChangeRef.current()
+                    }
+                }
+            } catch (error) {
+                if (controller.signal.aborted) return
+                console.error("Workspace event stream failed", error)
+            }
+
+            if (!controller.signal.aborted) {
+                retryTimer = setTimeout(() => {
+                    onChangeRef.current()
+                    connect()
+                }, RECONNECT_DELAY_MS)
+            }
+        }
+
+        connect()
+
+        return () => {
+            controller.abort()
+            clearTimeout(retryTimer)
+        }
+    }, [workspaceId, token])
+}